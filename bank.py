@@ -0,0 +1,161 @@
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cipher import (
+    FREE_RESPONSE, HINTS, KEYWORD_FUNCS, MONOALPHABETIC, NAME_TO_CIPHER, PANGRAM,
+    aristocrat, aristocrat_hint, fractionated_morse, random_quote, window_quotes,
+)
+
+BANK_PATH = 'data/bank.jsonl'
+CHUNK_SIZE = 1000
+QUOTE_TRIES = 100
+
+# the question generation settings, the game's misc settings menu starts
+# out with these
+DEFAULT_OPTIONS = {
+    "min_ciphertext_length": 20,
+    "max_ciphertext_length": 100,
+    "min_chi-squared_value": 0,
+    "max_chi-squared_value": 40,
+    "max_free_response_length": 40,
+    "pangram_mode": False,
+    "aristocrat_hint": False,
+}
+
+def question_window(cipher, options):
+    min_len, max_len = options["min_ciphertext_length"], options["max_ciphertext_length"]
+    min_chi, max_chi = 0, 9999
+
+    if NAME_TO_CIPHER[cipher] in FREE_RESPONSE:
+        max_len = options["max_free_response_length"]
+
+    if NAME_TO_CIPHER[cipher] in MONOALPHABETIC:
+        min_chi, max_chi = options["min_chi-squared_value"], options["max_chi-squared_value"]
+
+    return min_len, max_len, min_chi, max_chi
+
+def question_hints(cipher, plaintext, keywords, author, chi_squared, options):
+    cipher_func = NAME_TO_CIPHER[cipher]
+    pangram = options["pangram_mode"]
+
+    if cipher == "fractionated_morse":
+        keywords = {**keywords, 'used': set([*fractionated_morse(plaintext, **keywords)])}
+
+    chi_text = ""
+    if cipher_func in MONOALPHABETIC:
+        chi_text = f"Chi: {chi_squared}. "
+
+    hints = f"{cipher.title().replace('_', ' ')}. {author}. {chi_text}" if not pangram else f"{cipher.title().replace('_', ' ')}. "
+
+    if options["aristocrat_hint"] and cipher_func in MONOALPHABETIC and not pangram:
+        hints += aristocrat_hint(plaintext)
+    else:
+        hints += HINTS[cipher](keywords)
+
+    return hints
+
+def build_question(cipher, options=DEFAULT_OPTIONS, used=()):
+    cipher_func = NAME_TO_CIPHER[cipher]
+    keywords = KEYWORD_FUNCS[cipher]()
+    pangram = options["pangram_mode"]
+
+    window = question_window(cipher, options)
+    quote = random_quote(*window)
+    tries = QUOTE_TRIES
+    while quote['content'] in used and tries > 0:
+        quote = random_quote(*window)
+        tries -= 1
+
+    # most of the window must have been used already, so pick from whatever is
+    # left of it, or let a repeat through once there is nothing left
+    if quote['content'] in used:
+        used = set(used)
+        unused = [q for q in window_quotes(*window) if q['content'] not in used]
+        if unused:
+            quote = random.choice(unused)
+
+    plaintext = quote['content'] if not pangram else PANGRAM
+    ciphertext = cipher_func(plaintext, **keywords)
+    if cipher_func == aristocrat:
+        ciphertext, _ = ciphertext
+
+    hints = question_hints(cipher, plaintext, keywords, quote['author'], quote['chiSquared'], options)
+
+    return {
+        'cipher': cipher,
+        'keywords': keywords,
+        'plaintext': plaintext,
+        'ciphertext': ciphertext,
+        'hints': hints,
+        'author': quote['author'],
+        'length': quote['length'],
+        'chiSquared': quote['chiSquared'],
+    }
+
+def build_chunk(seed, number, ciphers, options=DEFAULT_OPTIONS):
+    # each chunk has its own seed, so a bank comes out the same for a given seed
+    # no matter how many workers build it
+    random.seed(seed)
+
+    records = []
+    valid_ciphers = []
+    for _ in range(number):
+        if len(valid_ciphers) == 0:
+            valid_ciphers = ciphers.copy()
+        cipher = valid_ciphers.pop(random.randrange(0, len(valid_ciphers)))
+        records.append(build_question(cipher, options))
+    return records
+
+def build_bank(number, path=BANK_PATH, ciphers=None, options=DEFAULT_OPTIONS, workers=None, seed=None):
+    ciphers = ciphers or list(NAME_TO_CIPHER)
+    rng = random.Random(seed)
+    sizes = [min(CHUNK_SIZE, number - i) for i in range(0, number, CHUNK_SIZE)]
+    seeds = [rng.getrandbits(64) for _ in sizes]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool, open(path, 'a') as outfile:
+        for records in pool.map(build_chunk, seeds, sizes, [ciphers] * len(sizes), [options] * len(sizes)):
+            outfile.writelines([json.dumps(r) + '\n' for r in records])
+            outfile.flush()
+    return time.perf_counter() - start
+
+_banks = {}
+
+def load_bank(path=BANK_PATH):
+    if path not in _banks:
+        bank = {}
+        if os.path.exists(path):
+            with open(path) as infile:
+                for line in infile:
+                    record = json.loads(line)
+                    bank.setdefault(record['cipher'], []).append(record)
+        _banks[path] = bank
+    return _banks[path]
+
+def draw_question(cipher, options=DEFAULT_OPTIONS, used=(), path=BANK_PATH):
+    min_len, max_len, min_chi, max_chi = question_window(cipher, options)
+    matches = [
+        r for r in load_bank(path).get(cipher, [])
+        if min_len <= r['length'] <= max_len and min_chi <= r['chiSquared'] <= max_chi
+        and r['plaintext'] not in used
+    ]
+    if not matches:
+        return None
+
+    # the bank's hints were written with its own options, so they're made again
+    # for the game's
+    record = random.choice(matches)
+    hints = question_hints(cipher, record['plaintext'], record['keywords'], record['author'], record['chiSquared'], options)
+    return {**record, 'hints': hints}
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    seconds = build_bank(number, workers=workers, seed=seed)
+    print(f"Built {number} questions in {seconds:.2f}s ({number / seconds:.0f} questions/s) into {BANK_PATH}")
@@ -0,0 +1,164 @@
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from cipher import (
+    HINTS, KEYWORD_FUNCS, NAME_TO_CIPHER, aristocrat_hint, chi_squared,
+    fractionated_morse, get_quote_index, random_quote,
+)
+
+# from about one quote up to a few megabytes of text
+SIZES = [100, 10 ** 4, 10 ** 6, 4 * 10 ** 6]
+QUICK_SIZES = SIZES[:2]
+ROUNDS = 7
+ROUND_TIME = 0.05
+MAX_TIME = 1.0
+SEED = 0
+# back to back runs on a busy or virtual machine can wander by 10-30% on the
+# smallest inputs, so by default only flag slowdowns past that
+THRESHOLD = 0.25
+BASELINE_PATH = 'data/benchmarks.json'
+
+# the settings menu's default quote window
+QUOTE_WINDOW = (20, 100, 0, 40)
+
+_texts = {}
+
+def sample_text(size):
+    # quotes run together until the text is long enough, cut down to capital
+    # letters and single spaces so that every cipher takes it
+    if size not in _texts:
+        corpus = get_quote_index().corpus
+        quotes = ' '.join(' '.join([corpus.cleaned_text(i) for i in range(len(corpus))]).split())
+        _texts[size] = (quotes * (size // len(quotes) + 1))[:size].strip()
+    return _texts[size]
+
+def timed(func, *args):
+    # the fastest of a few rounds of calls, which is the least thrown off by
+    # whatever else the machine is doing. slow calls stop after a round or two.
+    # then one more call with allocations traced, so the tracing doesn't slow
+    # down the timed ones
+    best = math.inf
+    total = 0
+    for _ in range(ROUNDS):
+        calls = 0
+        start = time.perf_counter()
+        while calls == 0 or time.perf_counter() - start < ROUND_TIME:
+            func(*args)
+            calls += 1
+        seconds = time.perf_counter() - start
+        best = min(best, seconds / calls)
+        total += seconds
+        if total > MAX_TIME:
+            break
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def benchmark_ciphers(sizes):
+    results = {}
+    for name, cipher in NAME_TO_CIPHER.items():
+        random.seed(SEED)
+        keywords = KEYWORD_FUNCS[name]()
+        for size in sizes:
+            text = sample_text(size)
+            seconds, peak = timed(lambda: cipher(text, **keywords))
+            results[f'cipher/{name}/{size}'] = {'chars_per_second': len(text) / seconds, 'peak_bytes': peak}
+    return results
+
+def benchmark_chi_squared(sizes):
+    results = {}
+    for size in sizes:
+        text = sample_text(size)
+        seconds, peak = timed(chi_squared, text)
+        results[f'chi_squared/{size}'] = {'chars_per_second': len(text) / seconds, 'peak_bytes': peak}
+    return results
+
+def benchmark_calls():
+    # the ones that don't take a text get calls a second instead
+    text = sample_text(SIZES[0])
+    calls = {'random_quote': lambda: random_quote(*QUOTE_WINDOW), 'aristocrat_hint': lambda: aristocrat_hint(text)}
+    for name in NAME_TO_CIPHER:
+        random.seed(SEED)
+        keywords = KEYWORD_FUNCS[name]()
+        if name == "fractionated_morse":
+            keywords['used'] = set([*fractionated_morse(text, **keywords)])
+        calls[f'keywords/{name}'] = KEYWORD_FUNCS[name]
+        calls[f'hints/{name}'] = lambda hint=HINTS[name], keywords=keywords: hint(keywords)
+
+    results = {}
+    for name, func in calls.items():
+        random.seed(SEED)
+        seconds, peak = timed(func)
+        results[name] = {'calls_per_second': 1 / seconds, 'peak_bytes': peak}
+    return results
+
+def reference():
+    # a fixed bit of plain python work timed alongside the benchmarks, so a
+    # comparison can take out a machine that is just slower or busier overall
+    seconds, _ = timed(lambda: sorted([str(i) for i in range(10000)], key=hash))
+    return seconds
+
+def run(sizes=SIZES):
+    start = reference()
+    results = {**benchmark_ciphers(sizes), **benchmark_chi_squared(sizes), **benchmark_calls()}
+    return {
+        'python': platform.python_version(),
+        'reference': (start + reference()) / 2,
+        'results': results,
+    }
+
+def rate(result):
+    return result.get('chars_per_second', result.get('calls_per_second'))
+
+def compare(baseline, current, threshold=THRESHOLD):
+    # every benchmark in both runs that got slower by more than threshold,
+    # after scaling for how fast each machine ran the reference
+    speed = current['reference'] / baseline['reference']
+    slower = []
+    for name, result in current['results'].items():
+        if name in baseline['results']:
+            change = rate(result) * speed / rate(baseline['results'][name]) - 1
+            if change < -threshold:
+                slower.append((name, change))
+    return slower
+
+def argument(name, default=None):
+    # the value after an option, unless it's missing or another option
+    if name not in sys.argv:
+        return default
+    i = sys.argv.index(name) + 1
+    return sys.argv[i] if i < len(sys.argv) and not sys.argv[i].startswith('--') else default
+
+if __name__ == '__main__':
+    report = run(QUICK_SIZES if '--quick' in sys.argv else SIZES)
+
+    print(f"{'benchmark':<40} {'rate':>16} {'peak memory':>14}")
+    for name, result in report['results'].items():
+        unit = 'chars/s' if 'chars_per_second' in result else 'calls/s'
+        print(f"{name:<40} {rate(result):>8.3g} {unit} {result['peak_bytes'] / 1024:>11.1f}KB")
+
+    if '--save' in sys.argv:
+        path = argument('--save', BASELINE_PATH)
+        with open(path, 'w') as outfile:
+            json.dump(report, outfile, indent=4)
+        print(f"\nSaved baseline to {path}")
+
+    if '--compare' in sys.argv:
+        path = argument('--compare', BASELINE_PATH)
+        threshold = float(argument('--threshold', THRESHOLD))
+        with open(path) as infile:
+            slower = compare(json.load(infile), report, threshold)
+
+        print()
+        for name, change in slower:
+            print(f"SLOWER {name}: {-change:.0%} below the baseline")
+        print(f"{len(slower)} benchmarks more than {threshold:.0%} slower than {path}")
+        sys.exit(1 if slower else 0)
@@ -1,15 +1,17 @@
-import json
+import array
+import bisect
+import functools
 import math
 import random
 import re
 import string
 
-import numpy as np
 
 LETTER_MIN = 65
 LETTER_MAX = 90
 LETTER_RANGE = range(LETTER_MIN, LETTER_MAX + 1)
 LETTER_LIST = [chr(c) for c in LETTER_RANGE]
+LETTERS = ''.join(LETTER_LIST)
 
 NUMBER_MIN = 48
 NUMBER_MAX = 57
@@ -109,36 +111,74 @@ PERMUTATIONS_FRAC = [f + s for f in PERMUTATIONS_MORBIT for s in MORSE_CHARS][:-
 MIN_KEYWORD = 7
 MAX_KEYWORD = 9
 
+MORSE_TABLE = str.maketrans({**{k: v + 'x' for k, v in MORSE.items()}, ' ': 'x'})
+
 PANGRAM = "THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG"
 
 def rotate(l, n):
     return l[n:] + l[:n]
 
+def letter_counts(texts, upper=True):
+    # numpy is only imported once something needs it, which keeps it out of the
+    # game's startup
+    import numpy as np
+
+    if isinstance(texts, str):
+        texts = [texts]
+
+    # all texts share one byte buffer and each letter is binned under its text
+    # number, so a whole corpus is counted with a single bincount
+    encoded = [(t.upper() if upper else t).encode() for t in texts]
+    buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    text_ids = np.repeat(np.arange(len(encoded)), [len(e) for e in encoded])
+
+    is_letter = (buffer >= LETTER_MIN) & (buffer <= LETTER_MAX)
+    bins = text_ids[is_letter] * len(LETTER_LIST) + (buffer[is_letter] - LETTER_MIN)
+    counts = np.bincount(bins, minlength=len(encoded) * len(LETTER_LIST))
+    return counts.reshape(len(encoded), len(LETTER_LIST))
+
+def letter_stats(texts):
+    import numpy as np
+
+    counts = letter_counts(texts)
+    lengths = counts.sum(axis=1)
+
+    # texts without letters come out as nan instead of raising, so one of them
+    # doesn't stop a whole corpus being counted. callers have to check lengths
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = lengths[:, None] * np.array([FREQUENCIES[c] for c in LETTER_LIST])
+        chi = ((counts - expected) ** 2 / expected).sum(axis=1)
+        ioc = (counts * (counts - 1)).sum(axis=1) / (lengths * (lengths - 1))
+
+    return {
+        'counts': counts,
+        'lengths': lengths,
+        'chi_squared': chi,
+        'index_of_coincidence': ioc,
+        'unique_letters': (counts > 0).sum(axis=1),
+    }
+
 def chi_squared(text):
-    text_freqs = {}
+    # a single text is counted with str.count, which beats setting up numpy
+    # arrays for anything the size of a quote
+    counts = count_letters(text.upper())
+    length = sum(counts.values())
+    if length == 0:
+        raise ValueError("Can't take the chi squared value of a text with no letters")
 
     chi_squared_value = 0
-    length = 0
-
-    for c in text.upper():
-        if ord(c) in LETTER_RANGE:
-            text_freqs[c] = text_freqs.get(c, 0) + 1
-            length += 1
-    
     for k, v in FREQUENCIES.items():
-        actual = text_freqs.get(k, 0)
         expected = v * length
-        diff = actual - expected
+        diff = counts.get(k, 0) - expected
         chi_squared_value += (diff*diff) / expected
-    
+
     return chi_squared_value
 
 def count_letters(text):
     counts = {}
-    for c in text:
-        if ord(c) in LETTER_RANGE:
-            counts[c] = counts.get(c, 0) + 1
-    
+    for c in LETTER_LIST:
+        if (n := text.count(c)) > 0:
+            counts[c] = n
     return counts
 
 def clean(text, with_space=False):
@@ -146,186 +186,297 @@ def clean(text, with_space=False):
     return re.sub(pattern, '', text.upper())
 
 def generate_alphabet(key, offset=0):
-    cipher_alphabet = []
-    used_letters = LETTER_LIST.copy()
-    for c in key:
-        if c in used_letters:
-            cipher_alphabet.append(used_letters.pop(used_letters.index(c)))
+    keyed = dict.fromkeys(c for c in key if c in LETTERS)
+    cipher_alphabet = [*keyed] + [c for c in LETTER_LIST if c not in keyed]
+    return rotate(cipher_alphabet, -offset)
+
+@functools.lru_cache(maxsize=None)
+def derangement_count(n):
+    if n < 2:
+        return 1 - n
+    return (n - 1) * (derangement_count(n - 1) + derangement_count(n - 2))
+
+def random_derangement(n):
+    # the last element maps to a random other element j, and the rest is either
+    # a derangement of n - 2 elements (when j maps back, a 2-cycle) or one of
+    # n - 1 elements with the last element spliced in front of j. picking each
+    # case with its exact share of the derangement count makes it uniform
+    elements = list(range(n))
+    steps = []
+    while len(elements) > 1:
+        m = len(elements)
+        last = elements.pop()
+        j = random.randrange(m - 1)
+        target = elements[j]
+        two_cycle = random.randrange(derangement_count(m - 1) + derangement_count(m - 2)) < derangement_count(m - 2)
+        if two_cycle:
+            elements[j] = elements[-1]
+            elements.pop()
+        steps.append((last, target, two_cycle))
     
-    cipher_alphabet = rotate(cipher_alphabet + used_letters, -offset)
-    return cipher_alphabet
-
-def caesar_encrypt(text, shift=3):
-    text = text.upper()
-    encrpyted = ""
-    for c in text:
-        o = ord(c)
-        if o in LETTER_RANGE:
-            pos = o - LETTER_MIN
-            new_pos = (pos + shift) % 26
-            new_c = chr(new_pos + LETTER_MIN)
-            encrpyted += new_c
+    if elements:
+        raise ValueError("A single element has no derangement")
+
+    perm = [0] * n
+    inverse = [0] * n
+    for last, target, two_cycle in reversed(steps):
+        if two_cycle:
+            perm[last], perm[target] = target, last
+            inverse[last], inverse[target] = target, last
         else:
-            encrpyted += c
+            source = inverse[target]
+            perm[source], perm[last] = last, target
+            inverse[last], inverse[target] = source, last
     
-    return encrpyted
-
-def porta(text, key):
-    text, key = text.upper(), key.upper()
-    encrpyted = ""
-    i = 0
-    for c in text:
-        o = ord(c)
-        if o in LETTER_RANGE:
+    return perm
+
+def valid_offsets(key):
+    # generate_alphabet(key, offset) puts letter k of the unrotated alphabet in
+    # position k + offset, so an offset is only bad if it lands a letter on itself
+    fixed = {(ord(c) - LETTER_MIN - i) % len(LETTER_LIST) for i, c in enumerate(generate_alphabet(key))}
+    return tuple(o for o in range(len(LETTER_LIST)) if o not in fixed)
+
+class SubstitutionCipher:
+    def __init__(self, cipher_alphabets, plain_alphabet=LETTERS):
+        # one translation table per key letter, letters are enciphered with the
+        # tables in turn and non letters pass through without using up a key letter
+        self.tables = [str.maketrans(''.join(plain_alphabet), ''.join(a)) for a in cipher_alphabets]
+
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def caesar(cls, shift=3):
+        return cls([rotate(LETTERS, shift % 26)])
+
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def porta(cls, key):
+        alphabets = []
+        for k in key.upper():
             # thank you toebes for giving me nice code so i don't have to write 
             # out the alphabet manually
-            text_value = o - LETTER_MIN
-            key_value = ord(key[i % len(key)]) - LETTER_MIN
-            cipher_value = 0
-            if text_value < 13:
-                cipher_value = ((math.floor(key_value / 2) + text_value) % 13) + 13
-            else:
-                cipher_value = (13 - math.floor(key_value / 2) + text_value) % 13
-            encrpyted += chr(cipher_value + LETTER_MIN)
-            i += 1
-        else:
-            encrpyted += c
-    return encrpyted
+            half = (ord(k) - LETTER_MIN) // 2
+            alphabets.append([
+                chr(((half + p) % 13 + 13 if p < 13 else (13 - half + p) % 13) + LETTER_MIN)
+                for p in range(26)
+            ])
+        return cls(alphabets)
+
+    def encrypt(self, text, start=0):
+        text = text.upper()
+        if len(self.tables) == 1:
+            return text.translate(self.tables[0])
+
+        # odd entries are the runs of letters, which get enciphered together and
+        # then cut back into their original runs
+        runs = re.split(r'([A-Z]+)', text)
+        letters = [*''.join(runs[1::2])]
+        n = len(self.tables)
+        for i in range(n):
+            letters[i::n] = ''.join(letters[i::n]).translate(self.tables[(start + i) % n])
+        letters = ''.join(letters)
+
+        pos = 0
+        for i in range(1, len(runs), 2):
+            length = len(runs[i])
+            runs[i] = letters[pos:pos+length]
+            pos += length
+        
+        return ''.join(runs)
 
-def aristocrat(text, alphabet="RANDOM", pat=False, key=None, offset=0):
-    text = text.upper()
-    if pat:
-        text = clean(text)
-        text = " ".join([text[i:i+5] for i in range(0, len(text), 5)])
+def caesar_encrypt(text, shift=3):
+    return SubstitutionCipher.caesar(shift).encrypt(text)
+
+def porta(text, key):
+    return SubstitutionCipher.porta(key).encrypt(text)
 
-    encrpyted = ""
+def aristocrat_cipher(alphabet="RANDOM", key=None, offset=0):
     normal_alphabet = LETTER_LIST.copy()
     cipher_alphabet = []
     
     if alphabet == "RANDOM":
-        cipher_alphabet = LETTER_LIST.copy()
-        while any([LETTER_LIST[i] == cipher_alphabet[i] for i in range(len(LETTER_LIST))]):
-            random.shuffle(cipher_alphabet)
+        cipher_alphabet = [LETTER_LIST[i] for i in random_derangement(len(LETTER_LIST))]
     else:
         cipher_alphabet = generate_alphabet(key, offset)
 
     if alphabet == "K1":
         normal_alphabet, cipher_alphabet = cipher_alphabet, normal_alphabet
 
-    for c in text:
-        o = ord(c)
-        if o in LETTER_RANGE:
-            encrpyted += cipher_alphabet[normal_alphabet.index(c)]
-        else:
-            encrpyted += c
-    
-    return encrpyted, alphabet
+    return SubstitutionCipher([cipher_alphabet], normal_alphabet)
 
-def hill(text, key):
-    text, key = clean(text), key.upper()
-    mat_key = [ord(c) - LETTER_MIN for c in key]
-    mat_key = np.reshape(mat_key, (2, 2))
-    
-    encrpyted = ""
-    if len(text) % 2 != 0:
-        text += 'Z'
+def aristocrat(text, alphabet="RANDOM", pat=False, key=None, offset=0):
+    text = text.upper()
+    if pat:
+        text = clean(text)
+        text = " ".join([text[i:i+5] for i in range(0, len(text), 5)])
 
-    for i in range(0, len(text), 2):
-        mat_text = np.reshape([ord(c) - LETTER_MIN for c in text[i:i+2]], (2, 1))
-        mat_text = (np.matmul(mat_key, mat_text) % len(LETTER_LIST)).flatten()
-        for c in mat_text:
-            encrpyted += chr(c + LETTER_MIN)
+    return aristocrat_cipher(alphabet, key, offset).encrypt(text), alphabet
 
-    return encrpyted
+@functools.lru_cache(maxsize=1024)
+def hill_matrix(key):
+    import numpy as np
 
-def morse(text):
-    text = clean(text, True)
-    encrypted = ""
+    return np.reshape([ord(c) - LETTER_MIN for c in key.upper()], (2, 2))
 
-    for c in text:
-        if c != ' ':
-            encrypted += MORSE[c]
-            encrypted += 'x'
-        else:
-            encrypted += 'x'
-    
-    return encrypted[:-1]
+@functools.lru_cache(maxsize=1024)
+def hill_inverse(key):
+    import numpy as np
+
+    (a, b), (c, d) = hill_matrix(key).tolist()
+    det = (a * d - b * c) % len(LETTER_LIST)
+    if math.gcd(det, len(LETTER_LIST)) != 1:
+        raise ValueError(f"Hill key {key} is not invertible")
+
+    inverse = np.array([[d, -b], [-c, a]]) * pow(det, -1, len(LETTER_LIST))
+    return inverse % len(LETTER_LIST)
+
+def hill_transform(texts, matrices):
+    import numpy as np
+
+    # every digraph of every text goes through a single batched matmul, with
+    # each digraph paired up with the matrix for the text it came from
+    lengths = [len(t) // 2 for t in texts]
+    digraphs = np.frombuffer(''.join(texts).encode(), dtype=np.uint8).reshape(-1, 2, 1) - LETTER_MIN
+    mats = np.repeat(np.stack(matrices), lengths, axis=0)
+    transformed = np.matmul(mats, digraphs.astype(int)) % len(LETTER_LIST)
+    joined = (transformed.flatten() + LETTER_MIN).astype(np.uint8).tobytes().decode()
+
+    results = []
+    pos = 0
+    for length in lengths:
+        results.append(joined[pos:pos+length*2])
+        pos += length * 2
+    return results
+
+def hill_pad(text):
+    text = clean(text)
+    return text + 'Z' if len(text) % 2 != 0 else text
+
+def hill_batch(texts, keys, decrypt=False):
+    if isinstance(texts, str) and isinstance(keys, str):
+        texts, keys = [texts], [keys]
+    if isinstance(texts, str):
+        texts = [texts] * len(keys)
+    if isinstance(keys, str):
+        keys = [keys] * len(texts)
+    if len(texts) != len(keys):
+        raise ValueError("Need one key per text")
+    if not texts:
+        return []
+
+    if decrypt:
+        texts = [clean(t) for t in texts]
+        if any(len(t) % 2 != 0 for t in texts):
+            raise ValueError("Hill ciphertext must have an even number of letters")
+        matrices = [hill_inverse(k) for k in keys]
+    else:
+        texts = [hill_pad(t) for t in texts]
+        matrices = [hill_matrix(k) for k in keys]
+
+    return hill_transform(texts, matrices)
+
+def hill(text, key):
+    return hill_transform([hill_pad(text)], [hill_matrix(key)])[0]
+
+def hill_decrypt(text, key):
+    return hill_batch([text], [key], decrypt=True)[0]
+
+def morse(text):
+    return clean(text, True).translate(MORSE_TABLE)[:-1]
 
 def pollux(text, dots=[1,2,3], dashes=[4,5,6], spaces=[7,8,9,0]):
     morsept = morse(text)
-    encrypted = ""
 
     morse_map = {
-        '.': dots,
-        '-': dashes,
-        'x': spaces
+        '.': [str(n) for n in dots],
+        '-': [str(n) for n in dashes],
+        'x': [str(n) for n in spaces],
     }
 
-    for c in morsept:
-        encrypted += str(random.choice(morse_map[c]))
-    
-    return encrypted
+    return ''.join([random.choice(morse_map[c]) for c in morsept])
+
+@functools.lru_cache(maxsize=256)
+def morbit_table(perm):
+    return {pair: str(i + 1) for i, pair in enumerate(perm)}
 
 def morbit(text, perm=PERMUTATIONS_MORBIT.copy()):
     morsept = morse(text)
-    encrypted = ""
+    table = morbit_table(tuple(perm))
 
     if len(morsept) % 2 != 0:
         morsept += 'x'
 
-    for i in range(0, len(morsept), 2):
-        encrypted += str(perm.index(morsept[i:i+2]) + 1)
-    
-    return encrypted
+    return ''.join([table[morsept[i:i+2]] for i in range(0, len(morsept), 2)])
+
+@functools.lru_cache(maxsize=256)
+def fractionated_morse_table(key):
+    return dict(zip(PERMUTATIONS_FRAC, generate_alphabet(key)))
 
 def fractionated_morse(text, key=None):
     morsept = morse(text)
-    encrypted = ""
-    alphabet = generate_alphabet(key)
+    table = fractionated_morse_table(key)
 
     if (m := len(morsept) % 3) != 0:
         morsept += 'x' if m == 2 else 'xx'
     
-    for i in range(0, len(morsept), 3):
-        index = PERMUTATIONS_FRAC.index(morsept[i:i+3])
-        encrypted += alphabet[index]
+    return ''.join([table[morsept[i:i+3]] for i in range(0, len(morsept), 3)])
 
-    return encrypted
+# the orders for anything longer are built each time, a cached one holds four
+# bytes a letter for as long as it stays in the cache
+RAIL_CACHE_LENGTH = 4096
 
-def rail_fence(text, rails, offset=0):
-    text = [*clean(text)]
+def rail_order(length, rails, offset=0):
+    if length > RAIL_CACHE_LENGTH:
+        return build_rail_order(length, rails, offset)
+    return cached_rail_order(length, rails, offset)
 
-    offset %= rails * 2 - 2
+def rail_inverse(length, rails, offset=0):
+    if length > RAIL_CACHE_LENGTH:
+        return build_rail_inverse(length, rails, offset)
+    return cached_rail_inverse(length, rails, offset)
+
+def build_rail_order(length, rails, offset=0):
+    # letter j sits on the rail the zigzag reaches at step j + offset, and the
+    # ciphertext reads the rails top to bottom keeping each rail in text order
+    period = rails * 2 - 2
+    offset %= period
 
     rail_lists = [[] for _ in range(rails)]
-    current_rail = 0
-    step = 1
+    for j in range(length):
+        step = (j + offset) % period
+        rail_lists[step if step < rails else period - step].append(j)
 
-    while text:
-        if offset > 0:
-            offset -= 1
-        else:
-            rail_lists[current_rail].append(text.pop(0))
-        current_rail += step
-        if current_rail == 0 or current_rail == rails - 1:
-            step = -step
+    order = array.array('I')
+    for l in rail_lists:
+        order.extend(l)
+    return order
 
-    return ''.join([''.join(l) for l in rail_lists])
+def build_rail_inverse(length, rails, offset=0):
+    inverse = array.array('I', bytes(4 * length))
+    for i, j in enumerate(rail_order(length, rails, offset)):
+        inverse[j] = i
+    return inverse
 
-def bacon(text, a=['A'], b=['B']):
-    encrypted = []
+cached_rail_order = functools.lru_cache(maxsize=256)(build_rail_order)
+cached_rail_inverse = functools.lru_cache(maxsize=256)(build_rail_inverse)
+
+def rail_fence(text, rails, offset=0):
     text = clean(text)
+    return ''.join(map(text.__getitem__, rail_order(len(text), rails, offset)))
 
-    for c in text:
-        bacon_slice = BACON[c]
-        bacon_str = ""
-        for ab in bacon_slice:
-            l = a if ab == 'A' else b
-            bacon_str += str(random.choice(l))
+def rail_fence_decrypt(text, rails, offset=0):
+    text = clean(text)
+    return ''.join(map(text.__getitem__, rail_inverse(len(text), rails, offset)))
 
-        encrypted.append(bacon_str)
-    
-    return ' '.join(encrypted)
+def bacon(text, a=['A'], b=['B']):
+    ab_map = {
+        'A': [str(n) for n in a],
+        'B': [str(n) for n in b],
+    }
+
+    return ' '.join([
+        ''.join([random.choice(ab_map[ab]) for ab in BACON[c]])
+        for c in clean(text)
+    ])
 
 MONOALPHABETIC = [aristocrat]
 BREAKUP = [morbit, pollux, fractionated_morse]
@@ -335,28 +486,81 @@ FREE_RESPONSE = BREAKUP + [bacon]
 
 #print(bacon("THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG", [1,3,5,7,9], [2,4,6,8,0]))
 
+class WordStore:
+    def __init__(self, words):
+        # every word in a bucket has the same length, so each bucket is stored as
+        # one concatenated string and word i is a fixed width slice of it
+        buckets = {}
+        for w in words:
+            buckets.setdefault(len(w), []).append(w.upper())
+        self.buckets = {length: ''.join(b) for length, b in buckets.items()}
+        self.sizes = {length: len(b) for length, b in buckets.items()}
+        self.lengths = sorted(self.buckets)
+
+        self.ranges = {}
+
+    def word(self, length, i):
+        return self.buckets[length][i*length:(i+1)*length]
+
+    def range(self, min_length, max_length):
+        if (min_length, max_length) in self.ranges:
+            return self.ranges[(min_length, max_length)]
+
+        lengths = []
+        totals = []
+        for length in self.lengths[bisect.bisect_left(self.lengths, min_length):bisect.bisect_right(self.lengths, max_length)]:
+            lengths.append(length)
+            totals.append(self.sizes[length] + (totals[-1] if totals else 0))
+
+        self.ranges[(min_length, max_length)] = lengths, totals
+        return lengths, totals
+
+    def count(self, min_length, max_length):
+        totals = self.range(min_length, max_length)[1]
+        return totals[-1] if totals else 0
+
+    def sample(self, min_length, max_length):
+        lengths, totals = self.range(min_length, max_length)
+        if not totals:
+            raise ValueError(f"No words with length {min_length}-{max_length}")
+
+        n = random.randrange(totals[-1])
+        i = bisect.bisect_right(totals, n)
+        return self.word(lengths[i], n - (totals[i - 1] if i > 0 else 0))
+
+_word_stores = {}
+
+def get_word_store(path):
+    if path not in _word_stores:
+        with open(path) as infile:
+            _word_stores[path] = WordStore(infile.read().splitlines())
+    return _word_stores[path]
+
 def random_word(min, max):
-    with open('data/ten_thousand.txt') as infile:
-        lines = infile.read().splitlines()
-        choice = ""
-        while len(choice) < min or len(choice) > max:
-            choice = random.choice(lines)
-    return choice.upper()
+    return get_word_store('data/ten_thousand.txt').sample(min, max)
+
+_aristocrat_keys = {}
+
+def aristocrat_keys(min, max):
+    if (min, max) not in _aristocrat_keys:
+        store = get_word_store('data/ten_thousand.txt')
+        keys = []
+        for length in store.range(min, max)[0]:
+            for i in range(store.sizes[length]):
+                word = store.word(length, i)
+                offsets = valid_offsets(word)
+                if offsets:
+                    keys.append((word, offsets))
+        _aristocrat_keys[(min, max)] = keys
+    return _aristocrat_keys[(min, max)]
 
 def random_arisocrat(min, max):
-    word = random_word(min, max)
-    
-    alphabet = LETTER_LIST.copy()
-    offset = 0
-    while any([LETTER_LIST[i] == alphabet[i] for i in range(len(LETTER_LIST))]):
-        offset = random.randint(0, 25)
-        alphabet = generate_alphabet(word, offset)
-    
-    return {'key': word, 'offset': offset}
+    word, offsets = random.choice(aristocrat_keys(min, max))
+    return {'key': word, 'offset': random.choice(offsets)}
 
 def random_hill():
-    with open('data/hill2x2.txt') as infile:
-        return random.choice(infile.read().splitlines())
+    store = get_word_store('data/hill2x2.txt')
+    return store.sample(store.lengths[0], store.lengths[-1])
 
 def random_pollux():
     numbers = [i for i in range(10)]
@@ -382,15 +586,98 @@ def random_rail_fence():
     rails = random.randint(2, 6)
     return {'rails': rails, 'offset': random.randint(0, rails * 2 - 3)}
 
+class QuoteIndex:
+    def __init__(self, corpus):
+        import numpy as np
+
+        self.corpus = corpus
+
+        # a few quotes are in the corpus twice, only the first row of each is
+        # indexed so that a window's count is how many different quotes it has
+        firsts = {}
+        for i in range(len(corpus)):
+            firsts.setdefault(corpus.content(i), i)
+        rows = np.fromiter(firsts.values(), dtype=np.int64, count=len(firsts))
+        lengths = np.asarray(corpus.lengths, dtype=np.int64)[rows]
+        chi = np.asarray(corpus.chi_squared, dtype=np.int64)[rows]
+
+        # corpus rows sorted by chi squared and then length
+        by_chi = np.lexsort((lengths, chi))
+        self.order = rows[by_chi]
+        self.min_chi, self.max_chi = int(chi.min()), int(chi.max())
+        self.min_length, self.max_length = int(lengths.min()), int(lengths.max())
+
+        # starts[chi][length] is the index of the first quote with that chi squared
+        # value and at least that length, so every (chi, length range) is one slice
+        width = self.max_length - self.min_length + 2
+        keys = (chi[by_chi] - self.min_chi) * width + (lengths[by_chi] - self.min_length)
+        grid = np.arange((self.max_chi - self.min_chi + 1) * width).reshape(-1, width)
+        self.starts = np.searchsorted(keys, grid).tolist()
+
+        self.windows = {}
+
+    def window(self, min_length, max_length, min_chi, max_chi):
+        bounds = (
+            max(math.ceil(min_length), self.min_length),
+            min(math.floor(max_length), self.max_length),
+            max(math.ceil(min_chi), self.min_chi),
+            min(math.floor(max_chi), self.max_chi),
+        )
+        if bounds in self.windows:
+            return self.windows[bounds]
+
+        min_length, max_length, min_chi, max_chi = bounds
+        spans = []
+        totals = []
+        if min_length <= max_length:
+            for chi in range(min_chi, max_chi + 1):
+                row = self.starts[chi - self.min_chi]
+                start = row[min_length - self.min_length]
+                end = row[max_length - self.min_length + 1]
+                if end > start:
+                    spans.append(start)
+                    totals.append(end - start + (totals[-1] if totals else 0))
+
+        self.windows[bounds] = spans, totals
+        return spans, totals
+
+    def count(self, min_length, max_length, min_chi, max_chi):
+        totals = self.window(min_length, max_length, min_chi, max_chi)[1]
+        return totals[-1] if totals else 0
+
+    def quotes(self, min_length, max_length, min_chi, max_chi):
+        spans, totals = self.window(min_length, max_length, min_chi, max_chi)
+        for i, start in enumerate(spans):
+            size = totals[i] - (totals[i - 1] if i > 0 else 0)
+            for row in self.order[start:start + size]:
+                yield self.corpus.quote(row)
+
+    def sample(self, min_length, max_length, min_chi, max_chi):
+        spans, totals = self.window(min_length, max_length, min_chi, max_chi)
+        if not totals:
+            raise ValueError(f"No quotes with length {min_length}-{max_length} and chi squared {min_chi}-{max_chi}")
+
+        n = random.randrange(totals[-1])
+        i = bisect.bisect_right(totals, n)
+        return self.corpus.quote(self.order[spans[i] + n - (totals[i - 1] if i > 0 else 0)])
+
+_quote_index = None
+
+def get_quote_index():
+    global _quote_index
+    if _quote_index is None:
+        from corpus import load_corpus
+        _quote_index = QuoteIndex(load_corpus('data/newquotes.json'))
+    return _quote_index
+
 def random_quote(min_length, max_length, min_chi, max_chi):
-    with open('data/newquotes.json') as infile:
-        quotes = json.load(infile)
-        quote = random.choice(quotes)
-        while quote['length'] < min_length or quote['length'] > max_length or \
-            quote['chiSquared'] < min_chi or quote['chiSquared'] > max_chi:
-            quote = random.choice(quotes)
-    
-    return quote
+    return get_quote_index().sample(min_length, max_length, min_chi, max_chi)
+
+def quote_count(min_length, max_length, min_chi, max_chi):
+    return get_quote_index().count(min_length, max_length, min_chi, max_chi)
+
+def window_quotes(min_length, max_length, min_chi, max_chi):
+    return get_quote_index().quotes(min_length, max_length, min_chi, max_chi)
 
 def pollux_hint(dots, dashes, spaces):
     pollux_map = {**dots, **dashes, **spaces}
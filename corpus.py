@@ -0,0 +1,135 @@
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+from cipher import clean, letter_stats
+
+# every column of the corpus, in file order. text and cleaned are the uppercase
+# quotes and their cleaned forms run together, with quote i running from
+# offsets[i] to offsets[i + 1], and authors is a table shared through author_ids
+SECTIONS = [
+    ('text', '<u1'),
+    ('text_offsets', '<i8'),
+    ('lengths', '<i4'),
+    ('chi_squared', '<i4'),
+    ('cleaned', '<u1'),
+    ('cleaned_offsets', '<i8'),
+    ('author_ids', '<i4'),
+    ('authors', '<u1'),
+    ('author_offsets', '<i8'),
+]
+
+HEADER = struct.Struct(f'<4sHH{len(SECTIONS)}Q')
+MAGIC = b'FCQC'
+VERSION = 1
+ALIGNMENT = 8
+
+def corpus_path(json_path):
+    return os.path.splitext(json_path)[0] + '.qc'
+
+def padding(size):
+    return -size % ALIGNMENT
+
+def blob(strings):
+    encoded = [s.encode() for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+def convert(json_path, out_path=None):
+    out_path = out_path or corpus_path(json_path)
+    with open(json_path) as infile:
+        quotes = json.load(infile)
+
+    # newquotes.json uses content/author, the older files quoteText/quoteAuthor
+    contents = [q.get('content', q.get('quoteText', '')).upper() for q in quotes]
+    authors = [q.get('author', q.get('quoteAuthor', '')) or '' for q in quotes]
+
+    if all(['chiSquared' in q for q in quotes]):
+        chi = [q['chiSquared'] for q in quotes]
+    else:
+        chi = np.nan_to_num(np.rint(letter_stats(contents)['chi_squared']), nan=-1)
+
+    author_table = list(dict.fromkeys(authors))
+    author_ids = {a: i for i, a in enumerate(author_table)}
+
+    text, text_offsets = blob(contents)
+    cleaned, cleaned_offsets = blob([clean(c, True) for c in contents])
+    author_blob, author_offsets = blob(author_table)
+    columns = {
+        'text': text,
+        'text_offsets': text_offsets,
+        'lengths': np.array([q.get('length', len(c)) for q, c in zip(quotes, contents)], dtype=np.int32),
+        'chi_squared': np.array(chi, dtype=np.int32),
+        'cleaned': cleaned,
+        'cleaned_offsets': cleaned_offsets,
+        'author_ids': np.array([author_ids[a] for a in authors], dtype=np.int32),
+        'authors': author_blob,
+        'author_offsets': author_offsets,
+    }
+
+    temp_path = f'{out_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as outfile:
+        outfile.write(HEADER.pack(MAGIC, VERSION, 0, *[len(columns[name]) for name, _ in SECTIONS]))
+        outfile.write(bytes(padding(HEADER.size)))
+        for name, dtype in SECTIONS:
+            data = columns[name].astype(dtype).tobytes()
+            outfile.write(data)
+            outfile.write(bytes(padding(len(data))))
+    os.replace(temp_path, out_path)
+
+class QuoteCorpus:
+    def __init__(self, path):
+        with open(path, 'rb') as infile:
+            magic, version, _, *counts = HEADER.unpack(infile.read(HEADER.size))
+        if (magic, version) != (MAGIC, VERSION):
+            raise ValueError(f"{path} is not a version {VERSION} quote corpus")
+
+        # every column is a view straight into the mapped file
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        pos = HEADER.size + padding(HEADER.size)
+        for (name, dtype), count in zip(SECTIONS, counts):
+            size = count * np.dtype(dtype).itemsize
+            setattr(self, name, data[pos:pos + size].view(dtype))
+            pos += size + padding(size)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def content(self, i):
+        return self.text[self.text_offsets[i]:self.text_offsets[i + 1]].tobytes().decode()
+
+    def cleaned_text(self, i):
+        return self.cleaned[self.cleaned_offsets[i]:self.cleaned_offsets[i + 1]].tobytes().decode()
+
+    def author(self, i):
+        a = self.author_ids[i]
+        return self.authors[self.author_offsets[a]:self.author_offsets[a + 1]].tobytes().decode()
+
+    def quote(self, i):
+        return {
+            'content': self.content(i),
+            'author': self.author(i),
+            'length': int(self.lengths[i]),
+            'chiSquared': int(self.chi_squared[i]),
+        }
+
+def load_corpus(json_path):
+    path = corpus_path(json_path)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(json_path):
+        convert(json_path, path)
+    return QuoteCorpus(path)
+
+if __name__ == '__main__':
+    paths = sys.argv[1:] or [
+        'data/newquotes.json',
+        'data/quotes.json',
+        'data/cleaned.json',
+        'data/final.json',
+    ]
+    for path in paths:
+        convert(path)
+        print(f"Converted {path} to {corpus_path(path)}")
@@ -1,13 +1,22 @@
+import bisect
 import json
 import math
+import queue
 import random
+import sys
+import threading
+import time
+from collections import OrderedDict
 
 import pygame
 from pygame import mixer
 
+from bank import DEFAULT_OPTIONS, build_question, draw_question
 from cipher import *
 
-pygame.init()
+# only what the start screen needs, the mixer comes up later in load_assets
+pygame.display.init()
+pygame.font.init()
 
 SCREEN_WIDTH = 1920
 SCREEN_HEIGHT = 1080
@@ -26,19 +35,46 @@ WHITE = (255, 255, 255)
 MOVE_RIGHT = True
 MOVE_LEFT = False
 
-mixer.music.load("data/pandora.ogg")
-mixer.music.set_volume(0.25)
-
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 clock = pygame.time.Clock()
 
-big_font = pygame.font.Font("data/dotumche.ttf", 72)
+class LazyFont:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.font = None
+
+    def load(self):
+        if self.font is None:
+            self.font = pygame.font.Font(self.path, self.size)
+        return self.font
+
+    def render(self, *args):
+        return self.load().render(*args)
+
+big_font = LazyFont("data/dotumche.ttf", 72)
 title_font = pygame.font.Font("data/dotumche.ttf", 48)
 emp_font = pygame.font.Font("data/dotumche.ttf", 32)
 normal_font = pygame.font.Font("data/dotumche.ttf", 20)
 
 background_color = CYAN
 
+first_frame = True
+
+# rooms that change every frame by themselves, everything else is only redrawn
+# where something changed when dirty rendering is on
+ANIMATED_ROOMS = ["countdown", "question"]
+
+# rooms that only change when a key is pressed, where the loop sleeps until an
+# event comes in, still waking up every IDLE_WAIT milliseconds
+STATIC_ROOMS = ["start", "right", "wrong", "time", "end"]
+IDLE_WAIT = 1000
+FPS = 60
+QUESTION_READY = pygame.event.custom_type()
+last_frame = None
+redraw_all = True
+overlay_rects = []
+
 question = "Look at this funny caesar text. Decrypt it."
 
 timer = 0
@@ -55,6 +91,27 @@ class Game:
         self.room = "start"
         self.questions = []
 
+class Layer:
+    def __init__(self, rect):
+        # the part of the screen the panel is drawn in, it never draws outside
+        self.rect = pygame.Rect(rect)
+        self.surface = None
+
+    def invalidate(self):
+        self.surface = None
+
+    def blit(self, source, pos):
+        # render_text draws onto the layer with screen positions
+        self.surface.blit(source, (pos[0] - self.rect.x, pos[1] - self.rect.y))
+
+    def draw(self, draw):
+        # a panel is drawn once onto a clear surface and that is blitted every
+        # frame until something in the panel changes
+        if self.surface is None:
+            self.surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+            draw(self)
+        screen.blit(self.surface, self.rect)
+
 class Settings:
     def __init__(self) -> None:
         self.cipher_settings = {
@@ -77,14 +134,11 @@ class Settings:
         self.misc_settings = {
             "number_of_questions": 20,
             "time_per_question": 60 * 5,
-            "min_ciphertext_length": 20,
-            "max_ciphertext_length": 100,
-            "min_chi-squared_value": 0,
-            "max_chi-squared_value": 40,
-            "max_free_response_length": 40,
+            # the question generation settings, shared with the question bank
+            **DEFAULT_OPTIONS,
             "autofill": True,
-            "pangram_mode": False,
-            "aristocrat_hint": False,
+            "use_question_bank": False,
+            "dirty_rendering": True,
         }
 
         self.cursor_pos = 0
@@ -95,6 +149,12 @@ class Settings:
 
         self.LINE_SPACING = 0.03
 
+        # the menu titles down to the last line of the longer list
+        top = SCREEN_HEIGHT / 5 - emp_font.get_height()
+        bottom = SCREEN_HEIGHT * (0.25 + self.LINE_SPACING * max(len(self.cipher_settings), len(self.misc_settings))) + normal_font.get_height()
+        self.layer = Layer((0, top, SCREEN_WIDTH, bottom - top))
+        self.layer_state = None
+
     @property
     def current_settings(self):
         return self.cipher_settings if self.cursor_setting == "cipher" else self.misc_settings
@@ -140,8 +200,22 @@ class Settings:
                     if v is not None:
                         self.cipher_settings[k] = self.current_setting == "enable_all"
                 
+    @property
+    def state(self):
+        # everything the menu shows, the main loop edits number directly
+        return (
+            self.cursor_pos, self.cursor_setting, self.toggling_number, self.number,
+            *self.cipher_settings.values(), *self.misc_settings.values(),
+        )
+    
     def update(self):
-        render_text("CIPHER SETTINGS", emp_font, x=SCREEN_WIDTH / 3, y = SCREEN_HEIGHT / 5, offset=2)
+        if self.state != self.layer_state:
+            self.layer.invalidate()
+            self.layer_state = self.state
+        self.layer.draw(self.draw)
+    
+    def draw(self, surface):
+        render_text("CIPHER SETTINGS", emp_font, x=SCREEN_WIDTH / 3, y = SCREEN_HEIGHT / 5, offset=2, surface=surface)
         y_factor = 0.25
         for k, v in self.cipher_settings.items():
             s = ""
@@ -153,10 +227,10 @@ class Settings:
                 s = f"{k.title().replace('_', ' ')}: {v}"
             if self.cursor_setting == "cipher" and self.current_setting == k:
                     s = "> " + s
-            render_text(s, normal_font, x=SCREEN_WIDTH / 3, y = SCREEN_HEIGHT * y_factor, offset=2, c1=c1)
+            render_text(s, normal_font, x=SCREEN_WIDTH / 3, y = SCREEN_HEIGHT * y_factor, offset=2, c1=c1, surface=surface)
             y_factor += self.LINE_SPACING
 
-        render_text("MISC SETTINGS", emp_font, x=SCREEN_WIDTH * (2/3), y = SCREEN_HEIGHT / 5, offset=2)
+        render_text("MISC SETTINGS", emp_font, x=SCREEN_WIDTH * (2/3), y = SCREEN_HEIGHT / 5, offset=2, surface=surface)
         y_factor = 0.25
         for k, v in self.misc_settings.items():
             s = f"{k.title().replace('_', ' ')}: {v}"
@@ -165,13 +239,13 @@ class Settings:
                     s = f"Enter number: {self.number}"
                 else:
                     s = "> " + s
-            render_text(s, normal_font, x=SCREEN_WIDTH * (2/3), y = SCREEN_HEIGHT * y_factor, offset=2)
+            render_text(s, normal_font, x=SCREEN_WIDTH * (2/3), y = SCREEN_HEIGHT * y_factor, offset=2, surface=surface)
             y_factor += self.LINE_SPACING
 
 settings = Settings()
 
 class Question:
-    def __init__(self, question, text, cipher, time_to_answer, **kwargs):
+    def __init__(self, question, text, cipher, time_to_answer, ciphertext=None, **kwargs):
         self.kwargs = kwargs
 
         self.question = question
@@ -189,18 +263,29 @@ class Question:
 
         self.IS_FREE_RESPONSE = self.cipher in FREE_RESPONSE
 
-        self.ciphertext = cipher(text, **kwargs)
-        if self.cipher == aristocrat:
-            self.ciphertext, self.alphabet = self.ciphertext
-        self.counts = count_letters(self.ciphertext)
+        if ciphertext is None:
+            self.ciphertext = cipher(text, **kwargs)
+            if self.cipher == aristocrat:
+                self.ciphertext, self.alphabet = self.ciphertext
+        else:
+            self.ciphertext = ciphertext
+            self.alphabet = kwargs.get('alphabet', "RANDOM")
+        self.positions = {}
+        self.counts = {}
         self.discovered = {}
         self.cursor_pos = 0
         self.answer = ['']
         if not self.IS_FREE_RESPONSE:
             self.answer = [c if not c.isalpha() else "" for c in self.ciphertext]
-        self.punctuation = []
+        self.punctuation = bytearray()
+        self.unfilled = 0
         self.word_groups = []
         self.answer_groups = []
+        self.answer_breaks = [(0, 0)]
+        self.cipher_layout = []
+        self.answer_layout = []
+        self.dirty = []
+        self.shown_time = None
 
         self.START_X = 5
         self.START_Y_FACTOR = 0.35
@@ -208,6 +293,9 @@ class Question:
         self.FONT_SPACING = 24
         self.LINE_SPACING = 0.1 if not self.IS_FREE_RESPONSE else 0.05
         self.FREQ_SPACING = 60
+        # the letters at SCREEN_HEIGHT - 200 down to the discovered ones at - 100
+        self.freqs_layer = Layer((0, SCREEN_HEIGHT - 200 - emp_font.get_height(), SCREEN_WIDTH, 100 + emp_font.get_height() * 2))
+        self.CELL_HEIGHT = 40
         self.LIMIT = round(SCREEN_WIDTH / self.FONT_SPACING) - 1
 
         if self.cipher in BREAKUP and len(self.ciphertext) > self.LIMIT:
@@ -221,9 +309,13 @@ class Question:
             self.ciphertext = broken_string
 
         self.calculate_ranges(self.ciphertext, self.word_groups)
+        self.calculate_layout(self.word_groups, self.START_Y_FACTOR, self.cipher_layout)
         if self.IS_FREE_RESPONSE:
-            self.calculate_ranges(''.join(self.answer), self.answer_groups)
+            self.wrap_answer()
+        else:
+            self.calculate_layout(self.word_groups, self.ANSWER_Y_FACTOR, self.answer_layout)
         self.get_punctuation()
+        self.index_letters()
     
     def calculate_ranges(self, text, groups):
         groups.clear()
@@ -247,50 +339,156 @@ class Question:
                 num_chars += len(word) + 1
         groups.append([text[prev_index:], range(prev_index, len(text) + 1)])
     
+    def calculate_layout(self, groups, y_factor, layout, start=0):
+        # the screen position of every character from start on, worked out once
+        # when the text changes instead of searching the groups every frame
+        del layout[start:]
+        for group, (_, r) in enumerate(groups):
+            y = SCREEN_HEIGHT * (y_factor + group * self.LINE_SPACING)
+            for i in range(max(r.start, start), r.stop):
+                layout.append((self.START_X + (i - r.start) * self.FONT_SPACING, y))
+    
+    def wrap_answer(self, edit=0, shift=0):
+        # wraps the answer into lines just like calculate_ranges, but starting
+        # from the line before the one edited at edit, where shift letters went
+        # in or came out. answer_breaks has what calculate_ranges had counted when
+        # each line began, so wrapping can pick up from there. once a line begins
+        # past the edit the same way it did before, moved along by shift, every
+        # line after it would wrap the same too, so those are only moved along.
+        # returns the heights of the lines that came out different
+        groups, breaks, answer = self.answer_groups, self.answer_breaks, self.answer
+        end = len(answer) - 1
+        edited = edit + (shift >= 0)
+
+        line = max(0, bisect.bisect_right(groups, edit, key=lambda g: g[1].start) - 2)
+        start = prev = groups[line][1].start if groups else 0
+        num_chars, pos = breaks[line]
+
+        new_groups = []
+        new_breaks = []
+        synced = len(groups)
+        while pos <= end:
+            try:
+                word_end = answer.index(' ', pos, end)
+            except ValueError:
+                word_end = end
+            word_len = word_end - pos
+            pos = word_end + 1
+
+            if num_chars + word_len + 1 > self.LIMIT:
+                if num_chars == 0:
+                    num_chars = word_len + 1
+                new_groups.append([''.join(answer[prev:num_chars+prev]), range(prev, num_chars+prev)])
+                prev = num_chars + prev
+                num_chars = word_len + 1
+
+                i = line + len(new_groups)
+                if min(prev, pos) >= edited and i < len(groups) and \
+                    groups[i][1].start + shift == prev and breaks[i] == (num_chars, pos - shift):
+                    synced = i
+                    break
+                new_breaks.append((num_chars, pos))
+            else:
+                num_chars += word_len + 1
+        else:
+            new_groups.append([''.join(answer[prev:]), range(prev, end + 1)])
+
+        stop = groups[synced][1].start if synced < len(groups) else len(self.answer_layout)
+        old_groups = groups[line:synced]
+        groups[line:synced] = new_groups
+        breaks[line + 1:synced] = new_breaks
+        for i in range(line + len(new_groups), len(groups)):
+            r = groups[i][1]
+            groups[i][1] = range(r.start + shift, r.stop + shift)
+            breaks[i] = (breaks[i][0], breaks[i][1] + shift)
+
+        cells = []
+        changed = []
+        for i in range(line, line + max(len(new_groups), len(old_groups))):
+            y = SCREEN_HEIGHT * (self.ANSWER_Y_FACTOR + i * self.LINE_SPACING)
+            if i - line < len(new_groups):
+                r = new_groups[i - line][1]
+                cells += [(self.START_X + (j - r.start) * self.FONT_SPACING, y) for j in r]
+            if i - line >= min(len(new_groups), len(old_groups)) or new_groups[i - line][0] != old_groups[i - line][0]:
+                changed.append(y)
+        self.answer_layout[start:stop] = cells
+        return changed
+    
     def get_punctuation(self):
-        for i, c in enumerate(self.ciphertext):
-            if not c.isalpha():
-                self.punctuation.append(i)
+        self.punctuation = bytearray([not c.isalpha() for c in self.ciphertext])
+        self.unfilled = sum([c == "" and not p for c, p in zip(self.answer, self.punctuation)])
     
-    def get_group(self, index, groups):
-        for i, group in enumerate(groups):
-            if index in group[1]:
-                return i, (index % group[1].stop) - group[1].start
+    def index_letters(self):
+        # every cell each cipher letter is in, built once so autofill and the
+        # frequency table never have to go back over the ciphertext
+        for i, c in enumerate(self.ciphertext):
+            if c.isalpha():
+                self.positions.setdefault(c, []).append(i)
+        self.counts = {c: len(p) for c, p in self.positions.items() if c in LETTERS}
     
     def is_full(self):
         if self.IS_FREE_RESPONSE: 
-            return ''.join(self.answer) != ''
+            # the last cell is always the empty one new letters go into
+            return len(self.answer) > 1
 
-        for i, c in enumerate(self.answer):
-            if c == "" and i not in self.punctuation:
-                return False
-        return True
+        return self.unfilled == 0
     
-    def render_timer(self):
+    def set_cell(self, i, c):
+        # keeps count of the empty letter cells as they fill up and clear, so
+        # nothing has to look over every cell to know if the answer is done
+        if not self.punctuation[i]:
+            self.unfilled += (c == "") - (self.answer[i] == "")
+        self.answer[i] = c
+    
+    def cell_rect(self, i):
+        x, y = self.answer_layout[i]
+        return pygame.Rect(x, y - 1, self.FONT_SPACING, self.CELL_HEIGHT + 2)
+    
+    def line_rect(self, y):
+        return pygame.Rect(0, y - 1, SCREEN_WIDTH, self.CELL_HEIGHT + 2)
+    
+    def text_rect(self, y, font):
+        # the whole width around a line of centred text
+        return pygame.Rect(0, y - font.get_height(), SCREEN_WIDTH, font.get_height() * 2)
+    
+    def update_timer(self):
         self.time_left = self.time_to_answer - seconds
         if self.time_left <= 0:
             self.game.room = "time"
+
+        # the bar shrinks every frame but the number only changes once a second
+        self.dirty.append(pygame.Rect(0, SCREEN_HEIGHT / 5, SCREEN_WIDTH, 5))
+        shown_time = math.floor(clamp(self.time_left, 0, self.time_to_answer - 1))
+        if shown_time != self.shown_time:
+            self.shown_time = shown_time
+            self.dirty.append(pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT / 5))
+    
+    def timer_wait(self):
+        # seconds until the countdown number or the end of the timer bar next
+        # moves, which is all that changes on the question screen by itself
+        time_left = self.time_to_answer - seconds
+        if time_left <= 0:
+            return 0
+        bar = SCREEN_WIDTH * time_left / self.time_to_answer
+        return min(time_left - math.floor(time_left), (bar - math.floor(bar)) * self.time_to_answer / SCREEN_WIDTH)
+    
+    def render_timer(self):
         pygame.draw.rect(screen, DARK_BLUE, pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT / 5))
-        render_text(str(math.floor(clamp(self.time_left, 0, self.time_to_answer - 1))), big_font, y=SCREEN_HEIGHT / 10)
+        render_text(str(self.shown_time), big_font, y=SCREEN_HEIGHT / 10)
         pygame.draw.rect(screen, WHITE, pygame.Rect(0, SCREEN_HEIGHT / 5, SCREEN_WIDTH * self.time_left / self.time_to_answer, 5))
     
     def render_ciphertext(self):
-        for i, c in enumerate(self.ciphertext):
-            group, pos = self.get_group(i, self.word_groups)
-            x = self.START_X + (pos * self.FONT_SPACING)
-            y = self.START_Y_FACTOR + (group * self.LINE_SPACING)
+        for (x, y), c in zip(self.cipher_layout, self.ciphertext):
             if c != " ":
-                render_text(c, emp_font, x=x, y=SCREEN_HEIGHT * y, centered=False, offset=2)
+                render_text(c, emp_font, x=x, y=y, centered=False, offset=2)
     
     def render_cursor(self):
-        g = self.word_groups if not self.IS_FREE_RESPONSE else self.answer_groups
-        group, pos = self.get_group(self.cursor_pos, g)
-        x = self.START_X + (pos * self.FONT_SPACING)
-        y = self.ANSWER_Y_FACTOR + (group * self.LINE_SPACING)
-        pygame.draw.rect(screen, WHITE, pygame.Rect(x + 1, SCREEN_HEIGHT * y, self.FONT_SPACING - 1, 40))
+        x, y = self.answer_layout[self.cursor_pos]
+        pygame.draw.rect(screen, WHITE, pygame.Rect(x + 1, y, self.FONT_SPACING - 1, 40))
     
     def update_cursor(self, mode):
         factor = 1 if mode else -1
+        self.dirty.append(self.cell_rect(self.cursor_pos))
 
         if self.IS_FREE_RESPONSE:
             self.cursor_pos = wrap(self.cursor_pos + factor, 0, len(self.answer) - 1)
@@ -299,51 +497,67 @@ class Question:
             while not self.ciphertext[next].isalpha():
                 next = wrap(next + factor, 0, len(self.ciphertext) - 1)
             self.cursor_pos = next
+        self.dirty.append(self.cell_rect(self.cursor_pos))
     
     def render_answer(self):
-        for i, c in enumerate(self.answer):
-            g = self.word_groups if not self.IS_FREE_RESPONSE else self.answer_groups
-            group, pos = self.get_group(i, g)
-            x = self.START_X + (pos * self.FONT_SPACING)
-            y = self.ANSWER_Y_FACTOR + (group * self.LINE_SPACING)
+        for (x, y), c in zip(self.answer_layout, self.answer):
             if c != " " and c != "":
-                render_text(c, emp_font, x=x, y=SCREEN_HEIGHT * y, centered=False, c1=BLACK, c2=WHITE, offset=1)
+                render_text(c, emp_font, x=x, y=y, centered=False, c1=BLACK, c2=WHITE, offset=1)
     
     def update_answer(self, c):
+        was_full = self.is_full()
         if not self.IS_FREE_RESPONSE:
             prev_char = self.answer[self.cursor_pos]
-            self.answer[self.cursor_pos] = c
+            self.set_cell(self.cursor_pos, c)
+            self.dirty.append(self.cell_rect(self.cursor_pos))
             replace_c = self.ciphertext[self.cursor_pos]
             if self.cipher in MONOALPHABETIC:
                 if self.alphabet == "K2":
                     if c == '':
-                        self.discovered[prev_char] = c
+                        key, value = prev_char, c
                     else:
-                        self.discovered[c] = replace_c
+                        key, value = c, replace_c
                 else:
-                    self.discovered[replace_c] = c
+                    key, value = replace_c, c
+                # held backspace keeps clearing letters that are already clear
+                if self.discovered.get(key) != value:
+                    self.discovered[key] = value
+                    self.freqs_layer.invalidate()
+                    self.dirty.append(self.text_rect(SCREEN_HEIGHT - 100, emp_font))
                 if settings.get_misc_setting("autofill"):
-                    for i, old_c in enumerate(self.ciphertext):
-                        if old_c == replace_c:
-                            self.answer[i] = c
+                    for i in self.positions[replace_c]:
+                        self.set_cell(i, c)
+                        self.dirty.append(self.cell_rect(i))
         else:
             if self.cursor_pos == len(self.answer) - 1:
+                # the last cell is where new letters go in, there is nothing to delete
+                if c == "":
+                    return
                 self.answer.insert(len(self.answer) - 1, c)
             else:
                 self.answer[self.cursor_pos] = c
                 if c == "":
                     del self.answer[self.cursor_pos]
-            self.calculate_ranges(''.join(self.answer), self.answer_groups)
+
+            # the layout still has a cell for every letter from before the edit
+            shift = len(self.answer) - len(self.answer_layout)
+            self.dirty += [self.line_rect(y) for y in self.wrap_answer(self.cursor_pos, shift)]
+
+        if self.is_full() != was_full:
+            self.dirty.append(self.text_rect(SCREEN_HEIGHT - 50, emp_font))
     
     def render_freqs(self):
+        self.freqs_layer.draw(self.draw_freqs)
+    
+    def draw_freqs(self, surface):
         start = (SCREEN_WIDTH / 2) - (len(LETTER_LIST) - 1) * (self.FREQ_SPACING / 2)
         for i, c in enumerate(LETTER_LIST):
             offset = start + self.FREQ_SPACING * i
-            render_text(c, emp_font, x=offset, y=SCREEN_HEIGHT - 200, offset=2)
-            if c in self.counts.keys():
-                render_text(str(self.counts[c]), emp_font, x=offset, y=SCREEN_HEIGHT - 150, offset=2)
-            if c in self.discovered.keys():
-                render_text(self.discovered[c], emp_font, x=offset, y=SCREEN_HEIGHT - 100, c1=BLACK, c2=WHITE, offset=1)
+            render_text(c, emp_font, x=offset, y=SCREEN_HEIGHT - 200, offset=2, surface=surface)
+            if c in self.counts:
+                render_text(str(self.counts[c]), emp_font, x=offset, y=SCREEN_HEIGHT - 150, offset=2, surface=surface)
+            if c in self.discovered:
+                render_text(self.discovered[c], emp_font, x=offset, y=SCREEN_HEIGHT - 100, c1=BLACK, c2=WHITE, offset=1, surface=surface)
     
     def submit(self):
         if self.is_full():
@@ -374,19 +588,51 @@ class Question:
             render_text(f"{k.upper()}: {v}", normal_font, offset=2, y=SCREEN_HEIGHT / 2 + i)
             i += self.FONT_SPACING
 
-def render_text(text, font, x=SCREEN_WIDTH / 2, y=SCREEN_HEIGHT / 2, centered=True, c1=WHITE, shadow=True, c2=BLACK, offset=4):
-    if shadow:
-        rendered_text = font.render(text, False, c2)
-        text_rect = (x + offset, y + offset)
-        if centered:
-            text_rect = rendered_text.get_rect(center=text_rect)
-        screen.blit(rendered_text, text_rect)
-    
-    rendered_text = font.render(text, False, c1)
+class SurfaceCache:
+    def __init__(self, size=4096):
+        self.size = size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text, font, c1, shadow, c2, offset):
+        key = (font, text, c1, shadow, c2, offset)
+        if key in self.surfaces:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return self.surfaces[key]
+
+        self.misses += 1
+        rendered_text = font.render(text, False, c1)
+        if shadow:
+            # the shadow and the text go on one surface, with the text in the top
+            # left corner, so a cached string is a single blit
+            surface = pygame.Surface(
+                (rendered_text.get_width() + offset, rendered_text.get_height() + offset),
+                pygame.SRCALPHA,
+            )
+            surface.blit(font.render(text, False, c2), (offset, offset))
+            surface.blit(rendered_text, (0, 0))
+            rendered_text = surface
+
+        self.surfaces[key] = rendered_text
+        if len(self.surfaces) > self.size:
+            self.surfaces.popitem(last=False)
+        return rendered_text
+
+text_cache = SurfaceCache()
+
+def render_text(text, font, x=SCREEN_WIDTH / 2, y=SCREEN_HEIGHT / 2, centered=True, c1=WHITE, shadow=True, c2=BLACK, offset=4, surface=None):
+    rendered_text = text_cache.get(text, font, c1, shadow, c2, offset)
     text_rect = (x, y)
     if centered:
-        text_rect = rendered_text.get_rect(center=text_rect)
-    screen.blit(rendered_text, text_rect)
+        # centre the text itself, not the text and shadow together
+        width = rendered_text.get_width() - (offset if shadow else 0)
+        height = rendered_text.get_height() - (offset if shadow else 0)
+        text_rect = pygame.Rect(0, 0, width, height)
+        text_rect.center = (x, y)
+        text_rect = text_rect.topleft
+    (screen if surface is None else surface).blit(rendered_text, text_rect)
 
 def countdown(seconds):
     if seconds < 0.3:
@@ -404,16 +650,44 @@ def clamp(value, min_num, max_num):
 def wrap(value, min_num, max_num):
     return max_num if value < min_num else min_num if value > max_num else value
 
+def argument(name):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else None
+
+def frame_caps(option):
+    # "--fps 30" caps every room at 30fps, "--fps game=30,start=10" only the
+    # rooms named
+    caps = {None: FPS}
+    for item in option.split(',') if option else []:
+        room, _, fps = item.rpartition('=')
+        caps[room or None] = int(fps)
+    return caps
+
+def frame_wait():
+    # milliseconds until the room next looks different by itself, or None
+    # when it should run at its frame rate
+    if game.room in STATIC_ROOMS:
+        return IDLE_WAIT
+    elif game.room == "countdown":
+        # the background changes colour every 0.3 seconds
+        wait = (math.floor(seconds / 0.3) + 1) * 0.3 - seconds
+    elif game.room == "question":
+        if seconds > 1 and not questions.ready(current_question):
+            # QUESTION_READY wakes it up once the question is made
+            return IDLE_WAIT
+        wait = 1 - seconds
+    elif game.room == "game" and not right_pressed and not left_pressed:
+        wait = question.timer_wait()
+    else:
+        return None
+    return math.ceil(wait * 1000) if wait > 0 else None
+
 def generate_questions(number):
-    questions = []
     quotes = []
-    min_len, max_len, time_per, pangram, ahint = \
-        settings.get_misc_setting("min_ciphertext_length"), \
-        settings.get_misc_setting("max_ciphertext_length"), \
-        settings.get_misc_setting("time_per_question"), \
-        settings.get_misc_setting("pangram_mode"), \
-        settings.get_misc_setting("aristocrat_hint")
-    min_chi, max_chi = 0, 9999
+    options = settings.misc_settings.copy()
+    time_per, pangram, use_bank = \
+        options["time_per_question"], \
+        options["pangram_mode"], \
+        options["use_question_bank"]
     valid_ciphers = [k for k, v in settings.cipher_settings.items() if v]
     vc_copy = valid_ciphers.copy()
     
@@ -421,67 +695,201 @@ def generate_questions(number):
         if len(valid_ciphers) == 0:
             valid_ciphers = vc_copy.copy()
         cipher = valid_ciphers.pop(random.randrange(0, len(valid_ciphers)))
-        keywords = KEYWORD_FUNCS[cipher]()
 
-        if NAME_TO_CIPHER[cipher] in FREE_RESPONSE:
-            max_len = settings.get_misc_setting("max_free_response_length")
-        
-        if NAME_TO_CIPHER[cipher] in MONOALPHABETIC:
-            min_chi, max_chi = \
-                settings.get_misc_setting("min_chi-squared_value"), \
-                settings.get_misc_setting("max_chi-squared_value"), \
-
-        quote = random_quote(min_len, max_len, min_chi, max_chi)
-        while quote['content'] in quotes:
-            quote = random_quote(min_len, max_len, min_chi, max_chi)
+        record = None
+        if use_bank and not pangram:
+            record = draw_question(cipher, options, quotes)
+        if record is None:
+            record = build_question(cipher, options, quotes)
         
-        quotes.append(quote['content'])
-        plaintext = quote['content']
+        quotes.append(record['plaintext'])
 
-        if cipher == "fractionated_morse":
-            keywords['used'] = set([*fractionated_morse(plaintext, **keywords)])
-        
-        chi_text = ""
-        if NAME_TO_CIPHER[cipher] in MONOALPHABETIC:
-            chi_text = f"Chi: {quote['chiSquared']}. "
-        
-        hint_str = f"{cipher.title().replace('_', ' ')}. {quote['author']}. {chi_text}" if not pangram else f"{cipher.title().replace('_', ' ')}. "
+        cipher_func = NAME_TO_CIPHER[cipher]
+        yield Question(record['hints'], record['plaintext'], cipher_func, time_per, ciphertext=record['ciphertext'], **record['keywords'])
 
-        hints = hint_str
+class QuestionFeed:
+    def __init__(self, questions, number, prefetch=3):
+        # a worker thread keeps up to prefetch questions built ahead of the ones
+        # the player has reached, so the game loop never waits on generation
+        self.number = number
+        self.questions = []
+        self.error = None
+        self.buffer = queue.Queue(maxsize=prefetch)
+        self.thread = threading.Thread(target=self.fill, args=(questions,), daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return self.number
+
+    def fill(self, questions):
+        try:
+            for q in questions:
+                self.buffer.put(q)
+                pygame.event.post(pygame.event.Event(QUESTION_READY))
+        except Exception as e:
+            self.error = e
+            self.buffer.put(None)
+            pygame.event.post(pygame.event.Event(QUESTION_READY))
+
+    def ready(self, index):
+        return index < len(self.questions) or not self.buffer.empty()
+
+    def __getitem__(self, index):
+        while len(self.questions) <= index:
+            q = self.buffer.get()
+            if q is None:
+                raise self.error
+            self.questions.append(q)
+        return self.questions[index]
+
+def load_assets():
+    # everything the start screen doesn't need, loaded once it is up
+    mixer.init()
+    mixer.music.load("data/pandora.ogg")
+    mixer.music.set_volume(0.25)
+    big_font.load()
+    get_quote_index()
+
+def draw_room(room):
+    if room == "start":
+        render_text("FUNNY CIHPERS", title_font, y=50)
+        render_text("A very fun epic tool for cipher funny!!!", normal_font, y=100, offset=2)
 
-        if ahint and NAME_TO_CIPHER[cipher] in MONOALPHABETIC and not pangram:
-            hints += aristocrat_hint(plaintext)
-        else:
-            hints += HINTS[cipher](keywords)
+        settings.update()
 
-        if cipher == "fractionated_morse":
-            del keywords['used']
+        if not any([v for v in settings.cipher_settings.values()]):
+            render_text("At least one cipher must be enabled.", emp_font, y=SCREEN_HEIGHT - 100, offset=2, c1=BG_RED)
+        elif settings.get_misc_setting("number_of_questions") < sum([bool(b) for b in settings.cipher_settings.values()]):
+            render_text("Number of questions must be at least the number of ciphers enabled.", emp_font, y=SCREEN_HEIGHT - 100, offset=2, c1=BG_RED)
 
-        cipher_func = NAME_TO_CIPHER[cipher]
-        question = Question(hints, plaintext if not pangram else PANGRAM, cipher_func, time_per, **keywords)
-        questions.append(question)
-    
-    return questions
+        render_text("PRESS SPACE TO BEGIN", emp_font, y=SCREEN_HEIGHT - 50, offset=2)
+    elif room == "countdown":
+        countdown(seconds)
+    elif room == "game":
+        question.update()
+    elif room == "right":
+        render_text("Good job!", title_font, y=50)
+        render_text("You answered correctly!", normal_font, y=100, offset=2)
+        question.render_real_answer()
+        render_text("PRESS SPACE TO CONTINUE", emp_font, y=SCREEN_HEIGHT - 50, offset=2)
+    elif room == "wrong":
+        render_text("Bad job!", title_font, y=50)
+        render_text("You answered incorrectly! Correct answer below:", normal_font, y=100, offset=2)
+        question.render_real_answer()
+        render_text("PRESS SPACE TO CONTINUE", emp_font, y=SCREEN_HEIGHT - 50, offset=2)
+    elif room == "time":
+        render_text("Bad job!", title_font, y=50)
+        render_text("You ran out of time.", normal_font, y=100, offset=2)
+        question.render_real_answer()
+        render_text("PRESS SPACE TO CONTINUE", emp_font, y=SCREEN_HEIGHT - 50, offset=2)
+    elif room == "question":
+        render_text(f"Question {current_question + 1}", big_font)
+        if seconds > 1:
+            render_text("Loading...", emp_font, y=SCREEN_HEIGHT - 50, offset=2)
+    elif room == "end":
+        render_text(f"More coming soon", big_font)
+
+def merge_rects(rects):
+    # rects that share any rows get redrawn as one, so a line of autofilled
+    # cells is one pass over the scene instead of one per cell
+    merged = []
+    for rect in sorted(rects, key=lambda r: r.top):
+        if merged and rect.top < merged[-1].bottom:
+            merged[-1] = merged[-1].union(rect)
+        else:
+            merged.append(rect.copy())
+    return merged
+
+def draw_redraws(rects):
+    # outlines what was redrawn this frame, handing back what was under the
+    # overlay so it can be put back once the frame is on screen
+    area = sum([r.width * r.height for r in rects])
+    label = f"Redrawn: {area} px ({100 * area / (SCREEN_WIDTH * SCREEN_HEIGHT):.1f}%)"
+    width, height = normal_font.size(label)
+    covered = [r.clip(screen.get_rect()) for r in rects + [pygame.Rect(0, 0, width + 10, height + 10)]]
+    under = [(r, screen.subsurface(r).copy()) for r in covered]
+
+    for rect in rects:
+        pygame.draw.rect(screen, BG_RED, rect, 1)
+    render_text(label, normal_font, x=5, y=5, centered=False, offset=1)
+    return under
+
+assets = threading.Thread(target=load_assets, daemon=True)
+
+def wait_for_assets():
+    # a key press already waiting on the first frame can get here before the
+    # thread has been started
+    if assets.ident is None:
+        assets.start()
+    assets.join()
 
 game = Game()
+
+# a replay feeds scripted or recorded key presses through the loop with the
+# frame times they were made with, as fast as the loop can go
+replay = None
+recorder = None
+if argument("--replay"):
+    from replay import Replay
+    replay = Replay(argument("--replay"))
+    random.seed(replay.seed)
+elif argument("--record"):
+    from replay import Recorder
+    recorder = Recorder(argument("--record"), random.randrange(2 ** 32))
+    random.seed(recorder.seed)
+frame_times = [] if argument("--frame-report") else None
+fps_caps = frame_caps(argument("--fps"))
+
 running = True
 while running:
-    dt = clock.tick(60)
+    events = []
+    slept = False
+    if replay:
+        dt = replay.next_frame()
+    else:
+        wait = None if first_frame else frame_wait()
+        slept = wait is not None
+        if wait is not None:
+            # nothing on screen moves for this long, so sleep until then
+            # unless something comes in first
+            event = pygame.event.wait(wait)
+            if event.type != pygame.NOEVENT:
+                events.append(event)
+        dt = clock.tick(fps_caps.get(game.room, fps_caps[None]))
+    if recorder:
+        recorder.next_frame(dt)
     timer += dt
     seconds = timer / 1000
 
-    for event in pygame.event.get():
+    if replay and game.room == "question" and seconds > 1:
+        # waits for the question outside the timed part of the frame, so the
+        # game starts on the same frame every run
+        questions[current_question]
+    frame_start = time.perf_counter()
+
+    key_pressed = False
+    for event in events + pygame.event.get():
+        if recorder:
+            recorder.event(event)
         if event.type == pygame.QUIT:
             running = False
+
+        if event.type == pygame.WINDOWEXPOSED:
+            redraw_all = True
         
         if event.type == pygame.KEYDOWN:
+            key_pressed = True
             if event.key == pygame.K_ESCAPE:
                 running = False
             if event.key == pygame.K_SPACE:
                 if game.room == "start" and not settings.toggling_number and \
                     any([v for v in settings.cipher_settings.values()]) and \
                     not settings.get_misc_setting("number_of_questions") < sum([bool(b) for b in settings.cipher_settings.values()]):
-                    questions = generate_questions(settings.get_misc_setting("number_of_questions"))
+                    number_of_questions = settings.get_misc_setting("number_of_questions")
+                    # the quote index has to be loaded before the feed's thread
+                    # goes looking for quotes in it
+                    wait_for_assets()
+                    questions = QuestionFeed(generate_questions(number_of_questions), number_of_questions)
                     mixer.music.play(-1)
                     timer = 0
                     seconds = 0
@@ -543,12 +951,19 @@ while running:
             except TypeError:
                 pass
     
-    keys = pygame.key.get_pressed()
+    events_done = time.perf_counter()
+
+    keys = replay.pressed if replay else pygame.key.get_pressed()
+    held = dt / 1000
+    if slept:
+        # a frame that slept waiting for the timer only counts as one frame of
+        # a key being held, or a tap that woke it up would start repeating
+        held = min(dt, math.ceil(1000 / (fps_caps.get(game.room, fps_caps[None]) or FPS))) / 1000
     if game.room == "game":
         if keys[pygame.K_RIGHT] or keys[pygame.K_SPACE]:
             if right_pressed > 0.5:
                 question.update_cursor(MOVE_RIGHT)
-            right_pressed += dt / 1000
+            right_pressed += held
         else:
             right_pressed = 0
         if keys[pygame.K_LEFT] or keys[pygame.K_BACKSPACE]:
@@ -556,7 +971,7 @@ while running:
                 question.update_cursor(MOVE_LEFT)
                 if keys[pygame.K_BACKSPACE]:
                     question.update_answer("")
-            left_pressed += dt / 1000
+            left_pressed += held
         else:
             left_pressed = 0
     
@@ -575,7 +990,7 @@ while running:
             seconds = 0
             game.room = "question"
     elif game.room == "question":
-        if seconds > 1:
+        if seconds > 1 and questions.ready(current_question):
             question = questions[current_question]
             timer = 0
             seconds = 0
@@ -585,42 +1000,63 @@ while running:
     elif game.room == "wrong" or game.room == "time":
         background_color = BG_RED
 
-    screen.fill(background_color)
-
-    if game.room == "start":
-        render_text("FUNNY CIHPERS", title_font, y=50)
-        render_text("A very fun epic tool for cipher funny!!!", normal_font, y=100, offset=2)
-
-        settings.update()
-
-        if not any([v for v in settings.cipher_settings.values()]):
-            render_text("At least one cipher must be enabled.", emp_font, y=SCREEN_HEIGHT - 100, offset=2, c1=BG_RED)
-        elif settings.get_misc_setting("number_of_questions") < sum([bool(b) for b in settings.cipher_settings.values()]):
-            render_text("Number of questions must be at least the number of ciphers enabled.", emp_font, y=SCREEN_HEIGHT - 100, offset=2, c1=BG_RED)
-
-        render_text("PRESS SPACE TO BEGIN", emp_font, y=SCREEN_HEIGHT - 50, offset=2)
-    elif game.room == "countdown":
-        countdown(seconds)
-    elif game.room == "game":
-        question.update()
-    elif game.room == "right":
-        render_text("Good job!", title_font, y=50)
-        render_text("You answered correctly!", normal_font, y=100, offset=2)
-        question.render_real_answer()
-        render_text("PRESS SPACE TO CONTINUE", emp_font, y=SCREEN_HEIGHT - 50, offset=2)
-    elif game.room == "wrong":
-        render_text("Bad job!", title_font, y=50)
-        render_text("You answered incorrectly! Correct answer below:", normal_font, y=100, offset=2)
-        question.render_real_answer()
-        render_text("PRESS SPACE TO CONTINUE", emp_font, y=SCREEN_HEIGHT - 50, offset=2)
-    elif game.room == "time":
-        render_text("Bad job!", title_font, y=50)
-        render_text("You ran out of time.", normal_font, y=100, offset=2)
-        question.render_real_answer()
-        render_text("PRESS SPACE TO CONTINUE", emp_font, y=SCREEN_HEIGHT - 50, offset=2)
-    elif game.room == "question":
-        render_text(f"Question {current_question + 1}", big_font)
-    elif game.room == "end":
-        render_text(f"More coming soon", big_font)
-    
-    pygame.display.flip()
\ No newline at end of file
+    room = game.room
+    if room == "game":
+        question.update_timer()
+    update_done = time.perf_counter()
+
+    frame = (room, background_color, current_question)
+    if not settings.get_misc_setting("dirty_rendering") or redraw_all or frame != last_frame or \
+        room in ANIMATED_ROOMS or (key_pressed and room != "game"):
+        screen.fill(background_color)
+        draw_room(room)
+        rects = [screen.get_rect()]
+    else:
+        # only the parts that changed get painted, each clipped so everything
+        # over them comes out exactly as a full redraw would
+        rects = merge_rects(question.dirty if room == "game" else [])
+        for rect in rects:
+            screen.set_clip(rect)
+            screen.fill(background_color)
+            draw_room(room)
+        screen.set_clip(None)
+    if room == "game":
+        question.dirty.clear()
+    last_frame = frame
+    redraw_all = False
+
+    shown = rects + overlay_rects
+    overlay = []
+    if "--show-redraws" in sys.argv:
+        overlay = draw_redraws(rects)
+        shown += [rect for rect, _ in overlay]
+
+    if rects == [screen.get_rect()]:
+        pygame.display.flip()
+    else:
+        pygame.display.update(shown)
+
+    # the overlay only goes to the display, what it covered is put back so the
+    # next frame just has to show it again
+    for rect, under in overlay:
+        screen.blit(under, rect)
+    overlay_rects = [rect for rect, _ in overlay]
+
+    if frame_times is not None:
+        frame_times.append([room, events_done - frame_start, update_done - events_done, time.perf_counter() - update_done])
+    if replay and (replay.done() or game.room == "end"):
+        running = False
+
+    if first_frame:
+        first_frame = False
+        if "--startup-report" in sys.argv:
+            print(f"First frame at {time.time()}")
+            running = False
+        elif assets.ident is None:
+            assets.start()
+
+if recorder:
+    recorder.save()
+if frame_times is not None:
+    with open(argument("--frame-report"), 'w') as outfile:
+        json.dump(frame_times, outfile)
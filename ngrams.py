@@ -0,0 +1,107 @@
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+from cipher import LETTER_LIST, LETTER_MIN, clean
+
+SPACE = len(LETTER_LIST)
+SYMBOLS = len(LETTER_LIST) + 1
+MAX_N = 4
+NGRAM_FLOOR = 0.3
+
+NGRAM_PATH = 'data/ngrams.bin'
+CORPUS_PATHS = ['data/quotes.json', 'data/newquotes.json', 'data/ten_thousand.txt']
+
+# magic, version, symbols, largest n. the header is followed by float32 log10
+# probabilities for n = 1 to MAX_N, first with word breaks kept and then with
+# them dropped, each table indexed by its packed symbol codes
+HEADER = struct.Struct('<4sHHI')
+MAGIC = b'FCNG'
+VERSION = 1
+
+def text_codes(text, spaces=True):
+    # letters are 0-25 and word breaks are SPACE, with one on each end so the
+    # first and last words get scored as words too
+    if spaces:
+        text = ' ' + ' '.join(clean(text, True).split()) + ' '
+    else:
+        text = clean(text)
+    codes = np.frombuffer(text.encode(), dtype=np.uint8).astype(np.int64)
+    return np.where(codes == ord(' '), SPACE, codes - LETTER_MIN)
+
+def ngram_indices(codes, n):
+    indices = codes[:len(codes) - n + 1].copy()
+    for i in range(1, n):
+        indices = indices * SYMBOLS + codes[i:len(codes) - n + 1 + i]
+    return indices
+
+def build_ngrams(texts, n, spaces=True):
+    indices = np.concatenate([ngram_indices(text_codes(t, spaces), n) for t in texts])
+    counts = np.bincount(indices, minlength=SYMBOLS ** n)
+    total = counts.sum()
+
+    table = np.full(SYMBOLS ** n, np.log10(NGRAM_FLOOR / total), dtype=np.float32)
+    seen = counts > 0
+    table[seen] = np.log10(counts[seen] / total)
+    return table
+
+def corpus_texts():
+    texts = []
+    with open('data/quotes.json') as infile:
+        texts += [q['quoteText'] for q in json.load(infile)]
+    with open('data/newquotes.json') as infile:
+        texts += [q['content'] for q in json.load(infile)]
+    with open('data/ten_thousand.txt') as infile:
+        texts += infile.read().splitlines()
+    return texts
+
+def write_ngrams(path=NGRAM_PATH):
+    texts = corpus_texts()
+
+    # written next to the real file and swapped in, so a worker process never
+    # maps a half written store
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as outfile:
+        outfile.write(HEADER.pack(MAGIC, VERSION, SYMBOLS, MAX_N))
+        for spaces in (True, False):
+            for n in range(1, MAX_N + 1):
+                outfile.write(build_ngrams(texts, n, spaces).tobytes())
+    os.replace(temp_path, path)
+
+def is_stale(path=NGRAM_PATH):
+    if not os.path.exists(path):
+        return True
+    built = os.path.getmtime(path)
+    return any([os.path.getmtime(p) > built for p in CORPUS_PATHS])
+
+def load_ngrams(path=NGRAM_PATH):
+    with open(path, 'rb') as infile:
+        magic, version, symbols, max_n = HEADER.unpack(infile.read(HEADER.size))
+    if (magic, version, symbols, max_n) != (MAGIC, VERSION, SYMBOLS, MAX_N):
+        raise ValueError(f"{path} is not a version {VERSION} n-gram store")
+
+    data = np.memmap(path, dtype=np.float32, mode='r', offset=HEADER.size)
+    tables = {}
+    pos = 0
+    for spaces in (True, False):
+        tables[spaces] = {}
+        for n in range(1, MAX_N + 1):
+            tables[spaces][n] = data[pos:pos + SYMBOLS ** n]
+            pos += SYMBOLS ** n
+    return tables
+
+_ngrams = None
+
+def get_ngrams(spaces=True):
+    global _ngrams
+    if _ngrams is None:
+        if is_stale():
+            write_ngrams()
+        _ngrams = load_ngrams()
+    return _ngrams[spaces]
+
+if __name__ == '__main__':
+    write_ngrams(sys.argv[1] if len(sys.argv) > 1 else NGRAM_PATH)
@@ -1,55 +1,7 @@
 import json
 import requests
 
-LETTER_RANGE = range(65, 91)
-
-frequencies = {
-    'E': 0.1249,
-    'T': 0.0928,
-    'A': 0.0804,
-    'O': 0.0764,
-    'I': 0.0757,
-    'N': 0.0723,
-    'S': 0.0651,
-    'R': 0.0628,
-    'H': 0.0505,
-    'L': 0.0407,
-    'D': 0.0382,
-    'C': 0.0334,
-    'U': 0.0273,
-    'M': 0.0251,
-    'F': 0.024,
-    'P': 0.0214,
-    'G': 0.0187,
-    'W': 0.0168,
-    'Y': 0.0166,
-    'B': 0.0148,
-    'V': 0.0105,
-    'K': 0.0054,
-    'X': 0.0023,
-    'J': 0.0016,
-    'Q': 0.0012,
-    'Z': 0.0009,
-}
-
-def chi_squared(text):
-    text_freqs = {}
-
-    chi_squared_value = 0
-    length = 0
-
-    for c in text.upper():
-        if ord(c) in LETTER_RANGE:
-            text_freqs[c] = text_freqs.get(c, 0) + 1
-            length += 1
-    
-    for k, v in frequencies.items():
-        actual = text_freqs.get(k, 0)
-        expected = v * length
-        diff = actual - expected
-        chi_squared_value += (diff*diff) / expected
-    
-    return chi_squared_value
+from cipher import letter_stats
 
 quotes = []
 
@@ -60,9 +12,15 @@ for i in range(103):
             'content': q['content'],
             'author': q['author'],
             'length': q['length'],
-            'chiSquared': round(chi_squared(q['content']))
         })
     print(f"Got page {i+1} which had {response.json()['count']} quotes")
 
+# a quote with no letters has no chi squared value and can't be enciphered
+stats = letter_stats([q['content'] for q in quotes])
+quotes = [q for q, n in zip(quotes, stats['lengths']) if n > 0]
+chi = stats['chi_squared'][stats['lengths'] > 0]
+for q, c in zip(quotes, chi):
+    q['chiSquared'] = round(float(c))
+
 with open('newquotes.json', 'w') as outfile:
     json.dump(quotes, outfile)
\ No newline at end of file
@@ -0,0 +1,146 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import pygame
+
+# a frame at 60fps, every phase of the loop together should fit in this
+FRAME_BUDGET = 1000 / 60
+FRAME_MS = 17
+PERCENTILES = [50, 90, 99]
+PHASES = ['events', 'update', 'render']
+
+# a replay is one entry per frame of the game loop, each the milliseconds that
+# frame's clock tick reported and the key events that came in on it
+class Replay:
+    def __init__(self, path):
+        with open(path) as infile:
+            data = json.load(infile)
+        self.seed = data['seed']
+        self.frames = data['frames']
+        self.frame = 0
+        self.pressed = defaultdict(bool)
+
+    def done(self):
+        return self.frame >= len(self.frames)
+
+    def next_frame(self):
+        # the events go through pygame's own queue, so the game loop picks them
+        # up exactly like real key presses
+        dt, events = self.frames[self.frame]
+        self.frame += 1
+        for down, key, unicode in events:
+            self.pressed[key] = down
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN if down else pygame.KEYUP, key=key, unicode=unicode))
+        return dt
+
+class Recorder:
+    def __init__(self, path, seed):
+        self.path = path
+        self.seed = seed
+        self.frames = []
+
+    def next_frame(self, dt):
+        self.frames.append([dt, []])
+
+    def event(self, event):
+        if event.type in (pygame.KEYDOWN, pygame.KEYUP):
+            self.frames[-1][1].append([event.type == pygame.KEYDOWN, event.key, getattr(event, 'unicode', '')])
+
+    def save(self):
+        with open(self.path, 'w') as outfile:
+            json.dump({'seed': self.seed, 'frames': self.frames}, outfile)
+
+def typing_script(frames=12000, questions=12, seconds=10, seed=0):
+    # shortens the game through the settings menu, then mashes keys. letters,
+    # spaces and deletes fill in answers, enter submits them and spaces also
+    # move on from the result screens, so every room gets visited
+    rng = random.Random(seed)
+    keys = [
+        (pygame.K_RIGHT, ''), (pygame.K_RETURN, '\r'), *[(ord(c), c) for c in str(questions)], (pygame.K_RETURN, '\r'),
+        (pygame.K_DOWN, ''), (pygame.K_RETURN, '\r'), *[(ord(c), c) for c in str(seconds)], (pygame.K_RETURN, '\r'),
+        (pygame.K_SPACE, ' '),
+    ]
+    script = [[FRAME_MS, []]]
+    for key, unicode in keys:
+        script += [[FRAME_MS, [[True, key, unicode]]], [FRAME_MS, [[False, key, unicode]]]]
+
+    while len(script) < frames:
+        r = rng.random()
+        if r < 0.6:
+            c = rng.choice('abcdefghijklmnopqrstuvwxyz')
+            key, unicode = ord(c), c
+        elif r < 0.75:
+            key, unicode = pygame.K_SPACE, ' '
+        elif r < 0.85:
+            key, unicode = pygame.K_BACKSPACE, '\b'
+        elif r < 0.95:
+            key, unicode = rng.choice([pygame.K_LEFT, pygame.K_RIGHT]), ''
+        else:
+            key, unicode = pygame.K_RETURN, '\r'
+        script += [[FRAME_MS, [[True, key, unicode]]], [FRAME_MS, [[False, key, unicode]]]]
+    return {'seed': seed, 'frames': script[:frames]}
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0
+
+def summarize(frames):
+    # milliseconds at each percentile for each phase and for the whole frame,
+    # over every frame and then room by room
+    rooms = defaultdict(list)
+    for frame in frames:
+        rooms['all'].append(frame)
+        rooms[frame[0]].append(frame)
+
+    summary = {}
+    for room, room_frames in rooms.items():
+        columns = {phase: [f[i + 1] * 1000 for f in room_frames] for i, phase in enumerate(PHASES)}
+        columns['total'] = [sum(f[1:]) * 1000 for f in room_frames]
+        summary[room] = {
+            'frames': len(room_frames),
+            **{phase: {p: percentile(times, p) for p in PERCENTILES + [100]} for phase, times in columns.items()},
+        }
+    return summary
+
+def run(script_path, display=False):
+    env = {**os.environ, 'PYGAME_HIDE_SUPPORT_PROMPT': '1'}
+    if not display:
+        env.update({'SDL_VIDEODRIVER': 'dummy', 'SDL_AUDIODRIVER': 'dummy'})
+
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, 'frames.json')
+        result = subprocess.run(
+            [sys.executable, 'main.py', '--replay', script_path, '--frame-report', report_path],
+            capture_output=True, text=True, env=env,
+        )
+        if not os.path.exists(report_path):
+            raise RuntimeError(f"main.py didn't finish the replay:\n{result.stderr[-2000:]}")
+        with open(report_path) as infile:
+            return json.load(infile)
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if args:
+        summary = summarize(run(args[0], '--display' in sys.argv))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            script_path = os.path.join(directory, 'script.json')
+            with open(script_path, 'w') as outfile:
+                json.dump(typing_script(), outfile)
+            summary = summarize(run(script_path, '--display' in sys.argv))
+
+    print(f"{'room':<10} {'frames':>7}  {'phase':<7}" + ''.join([f"{'p' + str(p):>11}" for p in PERCENTILES]) + f"{'max':>11}")
+    for room, stats in summary.items():
+        for i, phase in enumerate(PHASES + ['total']):
+            label = f"{room:<10} {stats['frames']:>7}" if i == 0 else ' ' * 18
+            print(f"{label}  {phase:<7}" + ''.join([f"{stats[phase][p]:9.3f}ms" for p in PERCENTILES + [100]]))
+    print()
+    worst = summary['all']['total'][99]
+    print(f"p99 frame {worst:.3f}ms, max {summary['all']['total'][100]:.3f}ms (budget {FRAME_BUDGET:.1f}ms)")
+    sys.exit(0 if worst <= FRAME_BUDGET else 1)
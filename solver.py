@@ -0,0 +1,194 @@
+import math
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cipher import (
+    FREQUENCIES, KEYWORD_FUNCS, LETTER_LIST, LETTERS, aristocrat, clean,
+    random_quote,
+)
+from ngrams import SPACE, SYMBOLS, get_ngrams, ngram_indices, text_codes
+
+SCORE_NGRAMS = (3, 4)
+
+# the steps for each restart grow with the letters in the ciphertext, but even
+# a short one needs MIN_STEPS to get anywhere
+STEPS_PER_LETTER = 400
+MIN_STEPS = 10000
+MAX_STEPS = 40000
+# restarts go on until a second one lands on the best score so far
+MAX_RESTARTS = 12
+# a puzzle is trivial when a short, cool search from the frequency key solves
+# it, about a thirtieth of a full search
+TRIVIAL_STEPS = 1000
+TRIVIAL_TEMPERATURE = 1.0
+
+ARISTOCRATS = [
+    "random_aristocrat",
+    "aristocrat_k1",
+    "aristocrat_k2",
+    "patristocrat_k1",
+    "patristocrat_k2",
+]
+
+# plaintext letter numbers from most to least common
+FREQUENCY_ORDER = [LETTER_LIST.index(c) for c in FREQUENCIES]
+
+def score(codes, key, tables):
+    plain = key[codes]
+    return sum([float(tables[n][ngram_indices(plain, n)].sum()) for n in SCORE_NGRAMS])
+
+def frequency_key(codes):
+    # most common cipher letter to E, the next to T and so on
+    counts = np.bincount(codes, minlength=SYMBOLS)[:len(LETTER_LIST)]
+    key = np.arange(SYMBOLS)
+    key[np.argsort(-counts, kind='stable')] = FREQUENCY_ORDER
+    return key
+
+def random_key(rng):
+    return np.array(rng.sample(range(len(LETTER_LIST)), len(LETTER_LIST)) + [SPACE])
+
+def anneal(codes, key, tables, rng, steps=10000, temperature=8.0):
+    # swap the plaintext letters of two cipher letters at a time, always keeping
+    # swaps that read more like english and sometimes keeping worse ones while
+    # the temperature is still high, so the search can climb out of dead ends
+    present = [c for c in np.unique(codes).tolist() if c != SPACE]
+    current = score(codes, key, tables)
+    best, best_key = current, key.copy()
+    for n in range(steps):
+        t = temperature * (1 - n / steps)
+        i = rng.choice(present)
+        j = rng.randrange(len(LETTER_LIST))
+        key[i], key[j] = key[j], key[i]
+        s = score(codes, key, tables)
+        if s >= current or rng.random() < math.exp((s - current) / t):
+            current = s
+            if s > best:
+                best, best_key = s, key.copy()
+        else:
+            key[i], key[j] = key[j], key[i]
+
+    return best_key, best
+
+def restart(ciphertext, seed, spaces=True, from_frequencies=False, steps=10000):
+    codes = text_codes(ciphertext, spaces)
+    rng = random.Random(seed)
+    key = frequency_key(codes) if from_frequencies else random_key(rng)
+    return anneal(codes, key, get_ngrams(spaces), rng, steps)
+
+def decrypt(ciphertext, key):
+    return ciphertext.translate(str.maketrans(LETTERS, ''.join([LETTER_LIST[k] for k in key[:len(LETTER_LIST)]])))
+
+def search_steps(ciphertext):
+    return min(MAX_STEPS, max(MIN_STEPS, len(clean(ciphertext)) * STEPS_PER_LETTER))
+
+def best_repeated(results):
+    scores = [r[1] for r in results]
+    return scores.count(max(scores)) > 1
+
+def solve(ciphertext, spaces=True, restarts=MAX_RESTARTS, steps=None, seed=None, workers=1):
+    start = time.perf_counter()
+    steps = steps or search_steps(ciphertext)
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(restarts)]
+    frequency_start = [i == 0 for i in range(restarts)]
+
+    # restarts run a round at a time, one per worker, until one lands on the
+    # best key again. a best score found only once may still be a dead end
+    results = []
+    pool = None
+    if workers > 1:
+        # the n-gram store is built here if it needs to be, so the workers
+        # only map it
+        get_ngrams(spaces)
+        pool = ProcessPoolExecutor(workers)
+    try:
+        while len(results) < restarts and not (results and best_repeated(results)):
+            batch = range(len(results), min(restarts, len(results) + workers))
+            args = [ciphertext] * len(batch), seeds[batch.start:batch.stop], [spaces] * len(batch), \
+                frequency_start[batch.start:batch.stop], [steps] * len(batch)
+            results += pool.map(restart, *args) if pool else map(restart, *args)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    key, best = max(results, key=lambda r: r[1])
+    return {
+        'plaintext': decrypt(ciphertext, key),
+        'key': ''.join([LETTER_LIST[k] for k in key[:len(LETTER_LIST)]]),
+        'score': best,
+        'restarts': len(results),
+        'converged': best_repeated(results),
+        'seconds': time.perf_counter() - start,
+    }
+
+def accuracy(solved, plaintext):
+    solved, plaintext = clean(solved), clean(plaintext)
+    if not plaintext:
+        return 1.0
+    return sum([a == b for a, b in zip(solved, plaintext)]) / len(plaintext)
+
+def solve_question(question, restarts=MAX_RESTARTS, steps=None, threshold=0.9):
+    ciphertext, plaintext, spaces = question
+    result = solve(ciphertext, spaces, restarts, steps)
+    result['accuracy'] = accuracy(result['plaintext'], plaintext)
+    result['solved'] = result['accuracy'] >= threshold
+
+    # if a few swaps on top of plain frequency analysis already crack it there
+    # is nothing for a student to do
+    codes = text_codes(ciphertext, spaces)
+    rng = random.Random(0)
+    key, _ = anneal(codes, frequency_key(codes), get_ngrams(spaces), rng, TRIVIAL_STEPS, TRIVIAL_TEMPERATURE)
+    result['trivial'] = accuracy(decrypt(ciphertext, key), plaintext) >= threshold
+    return result
+
+def solve_batch(questions, restarts=MAX_RESTARTS, steps=None, threshold=0.9, workers=None):
+    start = time.perf_counter()
+    n = len(questions)
+    get_ngrams()
+    with ProcessPoolExecutor(workers) as pool:
+        results = list(pool.map(
+            solve_question, questions, [restarts] * n, [steps] * n, [threshold] * n,
+            chunksize=max(1, n // 64),
+        ))
+    seconds = time.perf_counter() - start
+
+    times = [r['seconds'] for r in results]
+    summary = {
+        'questions': n,
+        'solved': sum([r['solved'] for r in results]),
+        # only a puzzle whose best key came up twice is called unsolvable, the
+        # rest ran out of restarts before the search settled
+        'unsolvable': sum([not r['solved'] and r['converged'] for r in results]),
+        'undecided': sum([not r['solved'] and not r['converged'] for r in results]),
+        'trivial': sum([r['trivial'] for r in results]),
+        'seconds': seconds,
+        'per_second': n / seconds if seconds > 0 else 0,
+        'median_time': statistics.median(times) if times else 0,
+        'max_time': max(times) if times else 0,
+    }
+    return results, summary
+
+def random_aristocrat_questions(number, min_length=20, max_length=100, min_chi=0, max_chi=40):
+    questions = []
+    for _ in range(number):
+        name = random.choice(ARISTOCRATS)
+        plaintext = random_quote(min_length, max_length, min_chi, max_chi)['content']
+        keywords = KEYWORD_FUNCS[name]()
+        ciphertext, _ = aristocrat(plaintext, **keywords)
+        questions.append((ciphertext, plaintext, not keywords.get('pat', False)))
+    return questions
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    _, summary = solve_batch(random_aristocrat_questions(number), workers=workers)
+    print(f"Solved {summary['solved']}/{summary['questions']} in {summary['seconds']:.2f}s "
+          f"({summary['per_second']:.1f} questions/s)")
+    print(f"Median time to solve {summary['median_time']:.3f}s, max {summary['max_time']:.3f}s")
+    print(f"Unsolvable: {summary['unsolvable']}, undecided: {summary['undecided']}, trivial: {summary['trivial']}")
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import time
+
+# seconds from launching main.py to its first frame on the dummy video driver,
+# which currently comes in at around 0.3s
+STARTUP_TARGET = 0.5
+TOP_IMPORTS = 15
+
+def import_times(stderr):
+    # -X importtime lines look like "import time: self | cumulative | package"
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times.append((int(cumulative_us), int(self_us), name.strip()))
+    return sorted(times, reverse=True)
+
+def measure(display=False):
+    env = {**os.environ, 'PYGAME_HIDE_SUPPORT_PROMPT': '1'}
+    if not display:
+        env.update({'SDL_VIDEODRIVER': 'dummy', 'SDL_AUDIODRIVER': 'dummy'})
+
+    start = time.time()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'main.py', '--startup-report'],
+        capture_output=True, text=True, env=env,
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith('First frame at '):
+            return float(line[len('First frame at '):]) - start, import_times(result.stderr)
+    raise RuntimeError(f"main.py never drew a frame:\n{result.stderr[-2000:]}")
+
+if __name__ == '__main__':
+    seconds, imports = measure('--display' in sys.argv)
+
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative_us, self_us, name in imports[:TOP_IMPORTS]:
+        print(f"{cumulative_us / 1000:10.1f}ms {self_us / 1000:8.1f}ms  {name}")
+    print()
+    print(f"First frame after {seconds:.3f}s (target {STARTUP_TARGET}s)")
+    sys.exit(0 if seconds <= STARTUP_TARGET else 1)
@@ -0,0 +1,136 @@
+import random
+
+from cipher import (
+    BACON, MORSE_TABLE, PERMUTATIONS_MORBIT, SubstitutionCipher,
+    aristocrat_cipher, clean, fractionated_morse_table, hill_matrix,
+    hill_transform, morbit_table, rail_order,
+)
+
+CHUNK_SIZE = 1 << 16
+
+def read_chunks(infile, size=CHUNK_SIZE):
+    return iter(lambda: infile.read(size), '')
+
+def as_chunks(source):
+    return [source] if isinstance(source, str) else source
+
+def group_letters(chunks, size=5):
+    count = 0
+    for chunk in as_chunks(chunks):
+        letters = clean(chunk)
+        # first finish the group left open by the last chunk, then start new ones
+        pos = -count % size
+        pieces = [letters[:pos]]
+        for i in range(pos, len(letters), size):
+            pieces.append((' ' if count + i > 0 else '') + letters[i:i+size])
+        count += len(letters)
+        yield ''.join(pieces)
+
+def whole_groups(codes, size):
+    # holds back the end of each chunk that doesn't fill a group, and pads the
+    # last one with separators like the one shot ciphers do
+    carry = ''
+    for code in codes:
+        code = carry + code
+        whole = len(code) - len(code) % size
+        carry = code[whole:]
+        yield code[:whole]
+    if carry:
+        yield carry.ljust(size, 'x')
+
+def stream_morse(chunks):
+    # the one shot morse drops the trailing separator, so always hold back the
+    # last character until we know whether more text is coming
+    pending = ''
+    for chunk in as_chunks(chunks):
+        code = pending + clean(chunk, True).translate(MORSE_TABLE)
+        pending = code[-1:]
+        yield code[:-1]
+
+def stream_aristocrat(chunks, alphabet="RANDOM", pat=False, key=None, offset=0):
+    cipher = aristocrat_cipher(alphabet, key, offset)
+    for chunk in group_letters(chunks) if pat else as_chunks(chunks):
+        if chunk:
+            yield cipher.encrypt(chunk)
+
+def stream_porta(chunks, key):
+    cipher = SubstitutionCipher.porta(key)
+    count = 0
+    for chunk in as_chunks(chunks):
+        if chunk:
+            yield cipher.encrypt(chunk, count)
+            count += len(clean(chunk))
+
+def stream_hill(chunks, key):
+    matrix = hill_matrix(key)
+    carry = ''
+    for chunk in as_chunks(chunks):
+        text = carry + clean(chunk)
+        even = len(text) - len(text) % 2
+        carry = text[even:]
+        if even:
+            yield hill_transform([text[:even]], [matrix])[0]
+    if carry:
+        yield hill_transform([carry + 'Z'], [matrix])[0]
+
+def stream_pollux(chunks, dots=[1,2,3], dashes=[4,5,6], spaces=[7,8,9,0]):
+    morse_map = {
+        '.': [str(n) for n in dots],
+        '-': [str(n) for n in dashes],
+        'x': [str(n) for n in spaces],
+    }
+
+    for code in stream_morse(chunks):
+        if code:
+            yield ''.join([random.choice(morse_map[c]) for c in code])
+
+def stream_morbit(chunks, perm=PERMUTATIONS_MORBIT.copy()):
+    table = morbit_table(tuple(perm))
+    for code in whole_groups(stream_morse(chunks), 2):
+        if code:
+            yield ''.join([table[code[i:i+2]] for i in range(0, len(code), 2)])
+
+def stream_fractionated_morse(chunks, key=None):
+    table = fractionated_morse_table(key)
+    for code in whole_groups(stream_morse(chunks), 3):
+        if code:
+            yield ''.join([table[code[i:i+3]] for i in range(0, len(code), 3)])
+
+def stream_rail_fence(chunks, rails, offset=0, size=CHUNK_SIZE):
+    # the top rail takes letters from the whole text, so this one has to keep
+    # every letter before it can yield anything
+    text = ''.join([clean(chunk) for chunk in as_chunks(chunks)])
+    order = rail_order(len(text), rails, offset)
+    for i in range(0, len(order), size):
+        yield ''.join(map(text.__getitem__, order[i:i+size]))
+
+def stream_bacon(chunks, a=['A'], b=['B']):
+    ab_map = {
+        'A': [str(n) for n in a],
+        'B': [str(n) for n in b],
+    }
+
+    started = False
+    for chunk in as_chunks(chunks):
+        groups = [
+            ''.join([random.choice(ab_map[ab]) for ab in BACON[c]])
+            for c in clean(chunk)
+        ]
+        if groups:
+            yield (' ' if started else '') + ' '.join(groups)
+            started = True
+
+NAME_TO_STREAM = {
+    "random_aristocrat": stream_aristocrat,
+    "aristocrat_k1": stream_aristocrat,
+    "aristocrat_k2": stream_aristocrat,
+    "patristocrat_k1": stream_aristocrat,
+    "patristocrat_k2": stream_aristocrat,
+    "porta": stream_porta,
+    "hill_2x2": stream_hill,
+    "pollux": stream_pollux,
+    "morbit": stream_morbit,
+    "fractionated_morse": stream_fractionated_morse,
+    "rail_fence": stream_rail_fence,
+    "bacon": stream_bacon,
+}